@@ -1,13 +1,19 @@
 #!/usr/bin/python3
-import logging
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 
 import pytz
 from dotenv import load_dotenv
-from jira import JIRA
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+
+import changelog_index
+import clients
+import consts
+import issue_cache
+import jira_data
+import metrics
+import notifier
+import staleness
+import teams
 
 load_dotenv()
 
@@ -20,67 +26,55 @@ HEADERS = {
 	"Authorization": f"Basic {os.environ.get('ENCODED_PWD')}"
 }
 
-# Environment Variables
-TPM_CHANNEL_ID = os.getenv("TPM_CHANNEL_ID")
-TEST_CHANNEL_ID = os.getenv("TEST_CHANNEL_ID")
-
 
 # Track Last Modifier of TLDR & Next Steps
-def get_last_modifier_data():
+def get_last_modifier_data(snapshot=None, query_string=consts.query_string):
 	out = []
-	query_string = """project in (INIT) AND Status NOT IN (Duplicate) AND (("Eng Team[Select List (multiple choices)]" IN ("Cloud Platform - Compute", "Cloud Platform - Control Plane", "Cloud Platform - Cloud Events", "Cloud Platform - Infra Automation & Optimization", "Cloud Platform - KPT Compute & Storage Infra", "Cloud Platform - Compute") OR "Teams with Dependencies[Select List (multiple choices)]" IN ("Cloud Platform - Compute", "Cloud Platform - Control Plane", "Cloud Platform - Cloud Events", "Cloud Platform - Infra Automation & Optimization", "Cloud Platform - KPT Compute & Storage Infra", "Cloud Platform - Compute"))  AND "Current Status[Dropdown]" IN ("🔴 Red", "🟡 Yellow")) ORDER BY cf[11908] ASC, updated ASC"""
-	jira = JIRA('https://confluentinc.atlassian.net',
-	            basic_auth=(os.getenv("ATLASSIAN_USERNAME"), os.getenv("ATLASSIAN_PASSWORD")))
-	
-	start_at = 0
-	max_results = 100
+	if snapshot is None:
+		# Without a snapshot the issues are fetched uncached; callers using the issue cache open and close it
+		snapshot = jira_data.IssueSnapshot(clients.get_jira(), [query_string], consts.slack_report_fields)
 	
-	while True:
-		issues_Jql = jira.search_issues(jql_str=query_string, expand='changelog', startAt=start_at,
-		                                maxResults=max_results)
-		if not issues_Jql:
-			break
-		for issue in issues_Jql:
+	issues = snapshot.issues(query_string)
+	with metrics.stage('slack.rows'):
+		for issue in issues:
 			consolidated_info = get_consolidated_info(issue)
 			simplified_info = construct_simplified_info(issue, consolidated_info)
 			
 			out.append(simplified_info)
-		
-		start_at += max_results
 	
 	return out
 
 
 def get_consolidated_info(issue):
-	changelog = issue.changelog
+	index = changelog_index.index_for(issue)
 	latest_changes = {'TLDR': None, 'Next Steps': None}
 	
-	for history in changelog.histories:
-		for item in history.items:
-			if item.field in latest_changes:
-				if latest_changes[item.field] is None or history.created > latest_changes[item.field]['created']:
-					latest_changes[item.field] = {
-						'issue_key': issue.key,
-						'field': item.field,
-						'created': history.created,
-						'author_email': history.author.emailAddress
-					}
+	for field in latest_changes:
+		change = index.latest(field)
+		if change is not None:
+			latest_changes[field] = {
+				'issue_key': issue.key,
+				'field': field,
+				'created': change.created,
+				'when': change.when,
+				'author_email': change.author_email
+			}
 	return latest_changes
 
 
 def construct_simplified_info(issue, latest_changes):
-	current_status_val = issue.raw['fields'].get('customfield_14218').get('value')
-	issue_type = issue.fields.issuetype.name
-	summary = issue.fields.summary
-	tldr_val = getattr(issue.fields, 'customfield_13786', None)
-	next_steps_val = getattr(issue.fields, 'customfield_11558', None)
-	status_val = issue.fields.status.name
-	assignee = issue.fields.assignee.emailAddress if issue.fields.assignee else None
-	target_release_month_val = issue.raw['fields'].get('customfield_14353').get('value')
-	initiative_type_val = issue.raw['fields'].get('customfield_12069').get('value')
+	fields = issue.raw['fields']
+	current_status_val = fields.get('customfield_14218').get('value')
+	issue_type = fields['issuetype']['name']
+	summary = fields['summary']
+	tldr_val = fields.get('customfield_13786')
+	next_steps_val = fields.get('customfield_11558')
+	status_val = fields['status']['name']
+	assignee = fields['assignee'].get('emailAddress') if fields.get('assignee') else None
+	target_release_month_val = fields.get('customfield_14353').get('value')
+	initiative_type_val = fields.get('customfield_12069').get('value')
 	
-	tldr_date, next_steps_date = parse_dates(latest_changes)
-	latest_change_date, latest_author = get_latest_change_info(tldr_date, next_steps_date, latest_changes)
+	latest_change_date, latest_author, latest_change_at = get_latest_change_info(latest_changes)
 	
 	return {
 		'type': issue_type,
@@ -89,6 +83,7 @@ def construct_simplified_info(issue, latest_changes):
 		'summary': summary,
 		'assignee': assignee,
 		'updated': latest_change_date,
+		'updated_at': latest_change_at,
 		'tldr': tldr_val,
 		'next_steps': next_steps_val,
 		'target_release_month': target_release_month_val,
@@ -98,97 +93,87 @@ def construct_simplified_info(issue, latest_changes):
 	}
 
 
-def parse_dates(latest_changes):
-	tldr_date = datetime.strptime(latest_changes['TLDR']['created'], '%Y-%m-%dT%H:%M:%S.%f%z') if latest_changes[
-		'TLDR'] else None
-	next_steps_date = datetime.strptime(latest_changes['Next Steps']['created'], '%Y-%m-%dT%H:%M:%S.%f%z') if \
-		latest_changes['Next Steps'] else None
-	return tldr_date, next_steps_date
-
-
-def get_latest_change_info(tldr_date, next_steps_date, latest_changes):
-	if tldr_date and next_steps_date:
-		if tldr_date > next_steps_date:
-			return latest_changes['TLDR']['created'], latest_changes['TLDR']['author_email']
-		else:
-			return latest_changes['Next Steps']['created'], latest_changes['Next Steps']['author_email']
-	elif tldr_date:
-		return latest_changes['TLDR']['created'], latest_changes['TLDR']['author_email']
-	elif next_steps_date:
-		return latest_changes['Next Steps']['created'], latest_changes['Next Steps']['author_email']
-	else:
-		return None, None
-
-
-def notify(channel_id, blocks_obj):
-	client = WebClient(token=os.environ.get("SLACK_BOT_TOKEN"))
-	logger = logging.getLogger(__name__)
+def get_latest_change_info(latest_changes):
+	# The most recent of the TLDR and Next Steps edits; Next Steps wins a tie
+	latest = None
+	for change in (latest_changes['TLDR'], latest_changes['Next Steps']):
+		if change and (latest is None or not latest['when'] > change['when']):
+			latest = change
+	if latest:
+		return latest['created'], latest['author_email'], latest['when']
+	return None, None, None
+
+
+def build_reminder_blocks(jira_issues_list, mention="<!subteam^S07N03BFDPV>", now=None):
+	"""
+	:param jira_issues_list: The rows returned by get_last_modifier_data.
+	:param mention: The team mention at the top of the reminder.
+	:param now: The time staleness is measured at, as an aware datetime; defaults to now.
+	:return: The Slack blocks listing initiatives whose TLDR/Next Steps weren't updated in the last
+	         staleness.STALE_AFTER_DAYS days, or were never updated, or an empty list when none are stale.
+	"""
+	pst_zone = pytz.timezone('US/Pacific')
+	now = now or datetime.now(timezone.utc)
 	
-	# ID of the channel you want to send the message to
-	channel_id = channel_id
+	with metrics.stage('slack.staleness', rows=len(jira_issues_list)):
+		frame = staleness.StalenessFrame.from_rows(jira_issues_list)
+		ages = frame.age_days(now)
+		stale = frame.stale_mask(ages=ages)
+		by_assignee = frame.rollup('assignee', stale, ages=ages)
+		n_stale = sum(count for _, count, _ in by_assignee)
+	if not by_assignee:
+		return []
 	
-	try:
-		# Call the chat.postMessage method using the WebClient
-		result = client.chat_postMessage(
-			channel=channel_id,
-			blocks=blocks_obj
-		)
-		logger.info(result)
-	
-	except SlackApiError as e:
-		logger.error(f"Error posting message: {e}")
+	block_section = [{"type": "section", "text": {"type": "mrkdwn",
+	                                              "text": f"{mention} \n *Due:* _Mon EOD_\n  Fill *_TLDR_*, *_Next Steps_* for these R/Y Initiatives ahead of the _Weekly Chad/Shaun Exec Review_"}},
+	                 {"type": "context", "elements": [{"type": "mrkdwn",
+	                                                   "text": f"*{n_stale}* of {len(frame)} stale by owner: {staleness.rollup_text(by_assignee)}"}]},
+	                 {"type": "divider"}]
+	for row, is_stale in zip(jira_issues_list, stale):
+		if not is_stale:
+			continue
+		issue_type = row['type']
+		current_status = row['current_status']
+		issue_key = row['key']
+		issue_url = "https://confluentinc.atlassian.net/browse/" + issue_key
+		summary = row['summary']
+		updated = row['updated_at']
+		pst_time_str = updated.astimezone(pst_zone).strftime('%Y-%m-%d %H:%M:%S') if updated else "Never"
+		
+		issue_block = {
+			"type": "section",
+			"text": {
+				"type": "mrkdwn",
+				"text": f"*<{issue_url}|{issue_key}>*\n\n *Type*: _{issue_type}_ \n\n *Current Status*: _{current_status}_ \n\n  *Summary*: _{summary}_ \n\n *Last Updated*: _{pst_time_str}_"
+			}
+		}
+		block_section.append(issue_block)
+	return block_section
 
 
 if __name__ == '__main__':
-	jira_issues_list = get_last_modifier_data()  # This gives list of all Jira Issues
-	date_format = "%Y-%m-%dT%H:%M:%S.%f%z"
-	pst_zone = pytz.timezone('US/Pacific')
-	
-	curr_date = datetime.strptime(datetime.now(pytz.utc).strftime(date_format), date_format)
-	if len(jira_issues_list) > 0:
-		block_section = [{"type": "section", "text": {"type": "mrkdwn",
-		                                              "text": "<!subteam^S07N03BFDPV> \n *Due:* _Mon EOD_\n  Fill *_TLDR_*, *_Next Steps_* for these R/Y Initiatives ahead of the _Weekly Chad/Shaun Exec Review_"}},
-		                 {"type": "divider"}]
-		for row in jira_issues_list:
-			issue_type = row['type']
-			current_status = row['current_status']
-			issue_key = row['key']
-			issue_url = "https://confluentinc.atlassian.net/browse/" + issue_key
-			assignee = row.get('assignee')
-			summary = row['summary']
-			updated_str = row['updated']
-			updated = datetime.strptime(updated_str, date_format)
-			
-			diff = curr_date - updated
-			days_diff = diff.days
-			
-			updated_by = row['updated_by']
-			tldr = row['tldr']
-			next_steps = row['next_steps']
+	metrics.configure()
+	team = teams.default_team()
+	cache = issue_cache.IssueCache.from_env()
+	try:
+		snapshot = jira_data.IssueSnapshot(clients.get_jira(), [team.jql], consts.slack_report_fields, cache=cache)
+		jira_issues_list = get_last_modifier_data(snapshot, team.jql)  # This gives list of all Jira Issues
+		if len(jira_issues_list) > 0:
+			block_section = build_reminder_blocks(jira_issues_list, team.slack_mention)
+			print(len(block_section))
 			
-			# Get issue custom fields data and create a table
-			# Call the update page function
-			if days_diff > 5:
-				pst_time = updated.astimezone(pst_zone)
-				pst_time_str = pst_time.strftime('%Y-%m-%d %H:%M:%S')
-				
-				issue_block = {
-					"type": "section",
-					"text": {
-						"type": "mrkdwn",
-						"text": f"*<{issue_url}|{issue_key}>*\n\n *Type*: _{issue_type}_ \n\n *Current Status*: _{current_status}_ \n\n  *Summary*: _{summary}_ \n\n *Last Updated*: _{pst_time_str}_"
-					}
-				}
-				block_section.append(issue_block)
-		print(len(block_section))
-		
-		# Send Slack Notification
-		if len(block_section) > 1:
-			# notify(channel_id=TEST_CHANNEL_ID, blocks_obj=block_section)
-			notify(channel_id=TPM_CHANNEL_ID, blocks_obj=block_section)
+			# Send Slack Notification
+			if block_section:
+				notifier.notify_channels(team.slack_channel_ids, block_section)
+			else:
+				print("No Filtered Jira Issues found")
+				print("Skipping Slack Notification")
 		else:
-			print("No Filtered Jira Issues found")
+			print("No Jira Issues found")
 			print("Skipping Slack Notification")
-	else:
-		print("No Jira Issues found")
-		print("Skipping Slack Notification")
+	finally:
+		# The cache is pruned even when Jira or Slack fails, as in page.main
+		if cache is not None:
+			cache.evict()
+			cache.close()
+		metrics.log_summary()
@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+"""
+Benchmarks for the report pipeline. Run with `python bench.py`, or `python bench.py pipeline --sizes 100 1000` for
+the end-to-end run against the stand-ins in fakes.py.
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import changelog_index
+import consts
+import fakes
+import text_diff
+
+
+def timed(fn, *args):
+	start = time.perf_counter()
+	result = fn(*args)
+	return result, time.perf_counter() - start
+
+
+def bench_added_lines(sizes=(50, 150, 500, 2000), edit_ratios=(0.1, 0.9), seed=7):
+	"""
+	Times text_diff.added_lines against text_diff.ndiff_added_lines on synthetic field edits and checks they agree.
+	A high edit ratio, where most lines are reworded, is ndiff's slow case because every changed line is
+	fuzzy-matched against every other.
+
+	:param sizes: The field sizes, in lines, to benchmark.
+	:param edit_ratios: The shares of reworded lines to benchmark.
+	:param seed: The random seed for the synthetic text.
+	:return: None
+	"""
+	rng = random.Random(seed)
+	print(f"{'lines':>6} {'edited':>7} {'ndiff (s)':>10} {'added_lines (s)':>16} {'speedup':>8}  same output")
+	for n_lines, edit_ratio in itertools.product(sizes, edit_ratios):
+		old_text, new_text = fakes.field_edit(rng, n_lines, edit_ratio)
+		expected, ndiff_time = timed(text_diff.ndiff_added_lines, old_text, new_text)
+		actual, fast_time = timed(text_diff.added_lines, old_text, new_text)
+		same = expected == actual
+		assert same, f"added_lines differs from ndiff on {n_lines} lines"
+		print(f"{n_lines:>6} {edit_ratio:>7.0%} {ndiff_time:>10.4f} {fast_time:>16.4f} {ndiff_time / max(fast_time, 1e-9):>7.1f}x  {same}")
+
+
+def measure(fn, *args, trace_memory=False):
+	"""
+	:param fn: The function to run.
+	:param args: The arguments to call it with.
+	:param trace_memory: Record the peak memory allocated during the call; tracemalloc must already be tracing.
+	:return: A (result, seconds, peak_bytes) tuple. peak_bytes is measured above what was allocated before the call,
+	         and is None when memory isn't traced.
+	"""
+	if not trace_memory:
+		result, seconds = timed(fn, *args)
+		return result, seconds, None
+	baseline, _ = tracemalloc.get_traced_memory()
+	tracemalloc.reset_peak()
+	result, seconds = timed(fn, *args)
+	_, peak = tracemalloc.get_traced_memory()
+	return result, seconds, peak - baseline
+
+
+def bench_team():
+	# The pipeline modules need the Jira, Confluence and Slack client libraries, so they're imported only by the
+	# pipeline benchmark
+	import teams
+	
+	return teams.Team(name="bench", jql="project = BENCH", filter_id="0", parent_page_id="1",
+	                  page_title="Bench Execution Review", heading="Bench", tpm_account_ids=["bench-tpm"],
+	                  slack_channel_ids=["C-BENCH"], slack_mention="@bench")
+
+
+def pipeline_stages(team, jira, state_path):
+	"""
+	Splits the page and Slack reports into stages that can be timed separately. The stages share one snapshot, so
+	later stages reuse the indexes and conversions earlier ones built, as they do in a real run.
+
+	:param team: The Team to report on.
+	:param jira: The JIRA client (or stand-in) the snapshot searches.
+	:param state_path: The publish state file to use.
+	:return: A list of (stage name, function) pairs, to be run in order.
+	"""
+	import app
+	import jira_data
+	import notifier
+	import page
+	
+	state = {}
+	
+	def search():
+		state['snapshot'] = jira_data.IssueSnapshot(jira, [team.jql], consts.page_report_fields)
+		state['issues'] = state['snapshot'].issues(team.jql)
+	
+	def parse_changelogs():
+		for issue in state['issues']:
+			changelog_index.index_for(issue)
+	
+	def diff():
+		state['texts'] = [page.get_added_markdown_text(issue, field) for issue in state['issues']
+		                  for field in ('TLDR', 'Next Steps')]
+	
+	def convert():
+		page.markup_converter.convert_many(state['texts'])
+	
+	def assemble():
+		with ThreadPoolExecutor(max_workers=page.RENDER_WORKERS) as executor:
+			state['body'] = page.build_page_body(team, state['snapshot'], executor)
+	
+	def publish():
+		page.PUBLISH_STATE_PATH = state_path
+		page.create_or_update_page(page.review_page_title(team), state['body'], force=True,
+		                           parent_page_id=team.parent_page_id)
+	
+	def notify():
+		blocks = app.build_reminder_blocks(app.get_last_modifier_data(state['snapshot'], team.jql), team.slack_mention)
+		notifier.notify_channels(team.slack_channel_ids, blocks)
+	
+	return [("search", search), ("changelog parsing", parse_changelogs), ("diffing", diff),
+	        ("markdown", convert), ("page assembly", assemble), ("publish", publish), ("slack digest", notify)]
+
+
+def run_pipeline(portfolio, latency=0.0, trace_memory=False):
+	"""
+	Runs every pipeline stage once against fresh stand-ins serving the portfolio.
+
+	:param portfolio: The issue JSON objects the Jira stand-in serves.
+	:param latency: The seconds each stand-in API call takes.
+	:param trace_memory: Record each stage's peak memory with tracemalloc.
+	:return: A (measurements, stand-ins) tuple; measurements is a list of (stage, seconds, peak_bytes) tuples and
+	         stand-ins the (jira, confluence, slack) fakes, holding their call counts.
+	"""
+	import clients
+	import jira_markup
+	import page
+	
+	stand_ins = fakes.FakeJira(portfolio, latency), fakes.FakeConfluence(latency), fakes.FakeSlack(latency)
+	clients.override(*stand_ins)
+	# Start every run with an empty conversion cache
+	page.markup_converter = jira_markup.JiraMarkupConverter()
+	
+	measurements = []
+	if trace_memory:
+		tracemalloc.start()
+	try:
+		with tempfile.TemporaryDirectory() as state_dir:
+			for stage, fn in pipeline_stages(bench_team(), stand_ins[0], os.path.join(state_dir, "state.json")):
+				_, seconds, peak = measure(fn, trace_memory=trace_memory)
+				measurements.append((stage, seconds, peak))
+	finally:
+		if trace_memory:
+			tracemalloc.stop()
+		clients.reset()
+	return measurements, stand_ins
+
+
+def bench_pipeline(sizes=(100, 1000, 10000), histories=150, text_lines=40, latency=0.0, trace_memory=True, seed=7):
+	"""
+	Runs the page and Slack reports end to end against the in-process stand-ins in fakes.py, on synthetic
+	portfolios of increasing size, and reports the time, throughput and peak memory of each stage. tracemalloc
+	slows allocation-heavy stages several times over, so memory is measured on a second, separate run.
+
+	:param sizes: The portfolio sizes, in initiatives, to benchmark.
+	:param histories: The number of changelog histories on each initiative.
+	:param text_lines: The number of lines in each TLDR and Next Steps field.
+	:param latency: The seconds each stand-in API call takes.
+	:param trace_memory: Also measure each stage's peak memory.
+	:param seed: The random seed for the synthetic portfolio.
+	:return: A list of dictionaries, one per size and stage, with the measurements printed.
+	"""
+	results = []
+	print(f"{'issues':>6} {'stage':<18} {'seconds':>9} {'issues/s':>10} {'peak MiB':>9}")
+	for n_issues in sizes:
+		portfolio = fakes.synthetic_portfolio(n_issues, histories, text_lines, seed)
+		timings, (jira, confluence, slack) = run_pipeline(portfolio, latency)
+		peaks = [peak for _, _, peak in run_pipeline(portfolio, latency, trace_memory=True)[0]] if trace_memory \
+			else [None] * len(timings)
+		
+		for (stage, seconds, _), peak in zip(timings, peaks):
+			peak_mib = f"{peak / 2 ** 20:>9.1f}" if peak is not None else f"{'-':>9}"
+			print(f"{n_issues:>6} {stage:<18} {seconds:>9.3f} {n_issues / max(seconds, 1e-9):>10.0f} {peak_mib}")
+			results.append({'issues': n_issues, 'stage': stage, 'seconds': seconds, 'peak_bytes': peak})
+		total = sum(seconds for _, seconds, _ in timings)
+		print(f"{n_issues:>6} {'total':<18} {total:>9.3f} {n_issues / max(total, 1e-9):>10.0f}")
+		print(f"{'':>6} API calls: jira {dict(jira.calls)}, confluence {dict(confluence.calls)}, "
+		      f"slack {dict(slack.calls)}")
+	return results
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Benchmark the report pipeline.")
+	parser.add_argument('suite', nargs='?', choices=['added-lines', 'pipeline', 'all'], default='all')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+	                    help="portfolio sizes for the pipeline benchmark, in initiatives")
+	parser.add_argument('--histories', type=int, default=150, help="changelog histories per initiative")
+	parser.add_argument('--text-lines', type=int, default=40, help="lines per TLDR and Next Steps field")
+	parser.add_argument('--latency', type=float, default=0.0, help="seconds each stand-in API call takes")
+	parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc, which slows every stage")
+	args = parser.parse_args()
+	
+	if args.suite in ('added-lines', 'all'):
+		bench_added_lines()
+	if args.suite in ('pipeline', 'all'):
+		bench_pipeline(args.sizes, args.histories, args.text_lines, args.latency, not args.no_memory)
@@ -0,0 +1,89 @@
+"""Per-issue changelog index, built in one pass over the histories."""
+from datetime import datetime
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+
+
+class FieldChange:
+	"""A single change to one field, taken from a changelog history item."""
+	__slots__ = ('created', 'when', 'author_email', 'from_string', 'to_string')
+	
+	def __init__(self, created, when, author_email, from_string, to_string):
+		self.created = created
+		self.when = when
+		self.author_email = author_email
+		self.from_string = from_string
+		self.to_string = to_string
+
+
+class ChangelogIndex:
+	"""
+	Maps each field name to its changes sorted oldest first. Each history's timestamp is parsed once, however many
+	fields it touches.
+	"""
+	__slots__ = ('key', 'source', '_changes')
+	
+	def __init__(self, key, histories):
+		"""
+		:param key: The issue key the changelog belongs to.
+		:param histories: The raw changelog histories, as found in issue.raw['changelog']['histories'].
+		"""
+		self.key = key
+		self.source = histories
+		self._changes = {}
+		for history in histories:
+			items = history.get('items')
+			if not items:
+				continue
+			created = history['created']
+			when = datetime.strptime(created, DATE_FORMAT)
+			author_email = (history.get('author') or {}).get('emailAddress')
+			for item in items:
+				self._changes.setdefault(item['field'], []).append(
+					FieldChange(created, when, author_email, item.get('fromString'), item.get('toString')))
+		for changes in self._changes.values():
+			changes.sort(key=lambda change: change.when)
+	
+	def latest(self, field_name):
+		"""
+		:param field_name: The name of the field, e.g. 'TLDR'.
+		:return: The most recent FieldChange for the field, or None if it was never changed.
+		"""
+		changes = self._changes.get(field_name)
+		return changes[-1] if changes else None
+	
+	def changes(self, field_name):
+		"""
+		:param field_name: The name of the field, e.g. 'Current Status'.
+		:return: Every FieldChange for the field, oldest first.
+		"""
+		return list(self._changes.get(field_name, ()))
+	
+	def last(self, field_name, n, with_value=False):
+		"""
+		:param field_name: The name of the field, e.g. 'Current Status'.
+		:param n: The maximum number of changes to return.
+		:param with_value: Skip changes that cleared the field.
+		:return: A list of up to n FieldChange objects, most recent first.
+		"""
+		out = []
+		for change in reversed(self._changes.get(field_name, ())):
+			if with_value and not change.to_string:
+				continue
+			out.append(change)
+			if len(out) == n:
+				break
+		return out
+
+
+def index_for(issue):
+	"""
+	:param issue: An issue fetched with its changelog.
+	:return: The issue's ChangelogIndex, built on first use and rebuilt if the changelog has been replaced since.
+	"""
+	histories = (issue.raw.get('changelog') or {}).get('histories', [])
+	index = getattr(issue, '_changelog_index', None)
+	if index is None or index.source is not histories:
+		index = ChangelogIndex(issue.key, histories)
+		issue._changelog_index = index
+	return index
@@ -0,0 +1,135 @@
+"""
+Shared Jira, Confluence and Slack clients. Each client is built on first use, so importing the report modules does no
+network I/O and doesn't load the client libraries until they're needed.
+"""
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Constants
+ATLASSIAN_URL = 'https://confluentinc.atlassian.net'
+# Keep-alive connections pooled per host; covers the widest worker pool in the pipeline
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+# Retries for Slack calls answered with HTTP 429, each after the Retry-After delay
+SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", "5"))
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+	client = _clients.get(name)
+	if client is None:
+		with _lock:
+			client = _clients.get(name)
+			if client is None:
+				client = _clients[name] = factory()
+	return client
+
+
+def _pooled(session):
+	from rate_limit import RateLimitedAdapter
+	
+	# Requests to the site from every session share one rate-limit-aware concurrency limiter
+	adapter = RateLimitedAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+	session.mount('https://', adapter)
+	session.mount('http://', adapter)
+	return session
+
+
+def _create_jira():
+	from jira import JIRA
+	
+	# _session is private, but mounting the adapter is the only way to pool and rate-limit the client's requests.
+	# Skip the server-info round trip JIRA() makes by default. Retries are left to the session's adapter, so the
+	# client's own retry loop is turned off rather than multiplying the attempts
+	jira = JIRA(ATLASSIAN_URL, basic_auth=(os.getenv("ATLASSIAN_USERNAME"), os.getenv("ATLASSIAN_PASSWORD")),
+	            get_server_info=False, max_retries=0)
+	_pooled(jira._session)
+	return jira
+
+
+def _create_confluence():
+	import requests
+	from atlassian import Confluence
+	
+	return Confluence(
+		url=ATLASSIAN_URL,
+		username=os.environ.get("ATLASSIAN_USERNAME"),
+		password=os.environ.get("ATLASSIAN_PASSWORD"),
+		cloud=True,
+		session=_pooled(requests.Session())
+	)
+
+
+def _create_slack():
+	from slack_sdk import WebClient
+	from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
+	
+	client = WebClient(token=os.environ.get("SLACK_BOT_TOKEN"))
+	client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=SLACK_MAX_RETRIES))
+	return client
+
+
+def get_jira():
+	"""
+	:return: The shared JIRA client.
+	"""
+	return _get_or_create('jira', _create_jira)
+
+
+def get_changelog_page(jira, key, start_at, max_results):
+	"""
+	Reads one page of an issue's changelog. The jira package has no public method for the paginated changelog
+	endpoint, so this is the one place its private _get_json is called.
+
+	:param jira: The JIRA client, or a stand-in with _get_json.
+	:param key: The issue key.
+	:param start_at: The index of the first history to return.
+	:param max_results: The maximum number of histories to return.
+	:return: The page as JSON, with the histories under 'values'.
+	"""
+	return jira._get_json(f'issue/{key}/changelog', params={'startAt': start_at, 'maxResults': max_results})
+
+
+def get_confluence():
+	"""
+	:return: The shared Confluence client.
+	"""
+	return _get_or_create('confluence', _create_confluence)
+
+
+def get_slack():
+	"""
+	:return: The shared Slack WebClient.
+	"""
+	return _get_or_create('slack', _create_slack)
+
+
+def override(jira=None, confluence=None, slack=None):
+	"""
+	Replaces the shared clients with the given objects, e.g. the stand-ins in fakes.py. Clients left as None are
+	unchanged.
+
+	:param jira: The object get_jira() should return.
+	:param confluence: The object get_confluence() should return.
+	:param slack: The object get_slack() should return.
+	:return: None
+	"""
+	with _lock:
+		for name, client in (('jira', jira), ('confluence', confluence), ('slack', slack)):
+			if client is not None:
+				_clients[name] = client
+
+
+def reset():
+	"""
+	Drops every client so the next call builds a new one, e.g. after credentials change.
+
+	:return: None
+	"""
+	with _lock:
+		_clients.clear()
@@ -1,12 +1,15 @@
-from datetime import datetime
-
-curr_date = datetime.now().strftime("%m/%d")
-
 query_string = """project in (INIT) AND Status NOT IN (Duplicate) AND (("Eng Team[Select List (multiple choices)]" IN ("Cloud Platform - Compute", "Cloud Platform - Control Plane", "Cloud Platform - Cloud Events", "Cloud Platform - Infra Automation & Optimization", "Cloud Platform - KPT Compute & Storage Infra", "Cloud Platform - Compute") OR "Teams with Dependencies[Select List (multiple choices)]" IN ("Cloud Platform - Compute", "Cloud Platform - Control Plane", "Cloud Platform - Cloud Events", "Cloud Platform - Infra Automation & Optimization", "Cloud Platform - KPT Compute & Storage Infra", "Cloud Platform - Compute"))  AND "Current Status[Dropdown]" IN ("🔴 Red", "🟡 Yellow")) ORDER BY cf[11908] ASC, updated ASC"""
 
-page_first_val = """<p><a href="https://confluentinc.atlassian.net/wiki/spaces/CIRE/pages/3601532117"><span style="color: rgb(7,71,166);"><u>go/cip-exec-review-notes</u></span></a></p>
+# Jira fields each report reads; searches request only these
+slack_report_fields = ['summary', 'issuetype', 'status', 'assignee', 'customfield_14218', 'customfield_13786',
+                       'customfield_11558', 'customfield_14353', 'customfield_12069']
+change_history_fields = ['summary', 'customfield_14218']
+page_report_fields = list(dict.fromkeys(slack_report_fields + change_history_fields))
+
+# Filled in by page.prev_page_link with a link to the previous review's page
+page_first_template = """<p><a href="https://confluentinc.atlassian.net/wiki/spaces/CIRE/pages/3601532117"><span style="color: rgb(7,71,166);"><u>go/cip-exec-review-notes</u></span></a></p>
 <p><a href="https://confluentinc.atlassian.net/wiki/spaces/CIRE/pages/3671917908/Automation+Testing+CIP+Cloud+Platform+Execution+Review">For Other Exec Reviews</a> </p>
-<p><a href="https://confluentinc.atlassian.net/wiki/spaces/CIRE/pages/3679947772/CIP+Cloud+Platform+Execution+Review+-+2024-09-24">Prev Page Link</a></p>
+{prev_page_link}
 <p><strong><u>Agenda:</u></strong></p>
 <ol start="1">
 <li>
@@ -16,6 +19,9 @@ page_first_val = """<p><a href="https://confluentinc.atlassian.net/wiki/spaces/C
 <li>
 <p>TPMs will be team level internal reviews and help finalizing the items that needs reviews from CIP Leads and post the latest updates here by Mon noon PT every week.</p></li></ol>
 <p><strong><u>Reviewers</u></strong>: CIP Eng and PM leads</p>"""
+# Used when no earlier review has been recorded in the history store
+prev_page_link_val = """<p><a href="https://confluentinc.atlassian.net/wiki/spaces/CIRE/pages/3679947772/CIP+Cloud+Platform+Execution+Review+-+2024-09-24">Prev Page Link</a></p>"""
+prev_page_link_template = """<p><ac:link><ri:page ri:content-title="{title}" /><ac:plain-text-link-body><![CDATA[Prev Page Link]]></ac:plain-text-link-body></ac:link></p>"""
 
 table_header_val = """<p />
 <table data-table-width="760" data-layout="default" ac:local-id="0318fde6-7251-4ff3-bc7a-77aad134e0e4" data-table-display-mode="default"><colgroup><col style="width: 95.0px;" /><col style="width: 664.0px;" /></colgroup>
@@ -26,8 +32,13 @@ table_header_val = """<p />
 <th>
 <p><strong>Topics for discussion</strong></p></th></tr>"""
 
-table_first_col_val = """<tr><td><p>""" + curr_date + """</p></td>"""
-table_second_col_const = """<td><p><strong>Cloud Platform &mdash; Control Plane/ Compute / IAO (TPMs: </strong><ac:link><ri:user ri:account-id="60744e43852e71006c5678b2" ri:local-id="70df8fe8-c6b5-4e2b-9adb-b7f7f072f9c0" /></ac:link> <ac:link><ri:user ri:account-id="712020:57c87adb-4a35-43b2-961a-5121dec7a24e" ri:local-id="35ab3d94-3f41-4f59-b1a8-cb34054c81b7" /></ac:link> <ac:link><ri:user ri:account-id="712020:19c8f7cd-3493-4096-ba83-31101eaa8225" ri:local-id="04985f28-7c40-465f-8bc4-26a2081f96df" /></ac:link>   )</p><p>See <a href="https://confluentinc.atlassian.net/issues/?filter=31272">Jira Reference</a> </p>"""
+# Filled in with the date the page is rendered on, e.g. "10/14"
+table_first_col_template = """<tr><td><p>{date}</p></td>"""
+# Filled in per team by teams.Team.table_second_col
+table_second_col_template = """<td><p><strong>{heading} (TPMs: </strong>{tpm_links}   )</p><p>See <a href="https://confluentinc.atlassian.net/issues/?filter={filter_id}">Jira Reference</a> </p>"""
+tpm_link_template = """<ac:link><ri:user ri:account-id="{account_id}" /></ac:link>"""
+# Used for TPMs whose mention's ri:local-id is known, so the page keeps the ids Confluence assigned to the mentions
+tpm_link_local_id_template = """<ac:link><ri:user ri:account-id="{account_id}" ri:local-id="{local_id}" /></ac:link>"""
 
 table_footer_val = """<td><p /></td></tr></tbody></table><p />"""
 
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+"""
+Export of every initiative's full Current Status timeline to CSV, JSON lines or Parquet. Issues are streamed from the
+search in batches and written as they arrive, so memory use does not grow with the size of the portfolio.
+"""
+import argparse
+import csv
+import json
+import os
+from datetime import timezone
+from itertools import islice
+
+from dotenv import load_dotenv
+
+import changelog_index
+import clients
+import consts
+import jira_data
+import metrics
+import teams
+
+load_dotenv()
+
+# Environment Variables
+# page.py also writes the timeline of the change history table's issues here when set; the extension picks the format
+STATUS_EXPORT_PATH = os.getenv("STATUS_EXPORT_PATH")
+
+# Constants
+COLUMNS = ['key', 'summary', 'current_status', 'changed_at', 'author_email', 'from_status', 'to_status']
+# Issues whose changelogs are completed and written together; also the Parquet row group size in issues
+EXPORT_BATCH_SIZE = jira_data.PAGE_SIZE
+
+
+def timeline_rows(issue):
+	"""
+	:param issue: An issue fetched with its complete changelog.
+	:return: A generator of one dictionary per change to the issue's Current Status, oldest first, with COLUMNS as
+	         keys. changed_at is a timezone-aware UTC datetime.
+	"""
+	fields = issue.raw['fields']
+	current_status = (fields.get('customfield_14218') or {}).get('value')
+	for change in changelog_index.index_for(issue).changes('Current Status'):
+		yield {
+			'key': issue.key,
+			'summary': fields.get('summary'),
+			'current_status': current_status,
+			'changed_at': change.when.astimezone(timezone.utc),
+			'author_email': change.author_email,
+			'from_status': change.from_string,
+			'to_status': change.to_string
+		}
+
+
+def _batches(iterable, size):
+	iterator = iter(iterable)
+	while batch := list(islice(iterator, size)):
+		yield batch
+
+
+def iter_issues_with_changelogs(jira, jql_str, batch_size=EXPORT_BATCH_SIZE):
+	"""
+	:param jira: The JIRA client used to run the search.
+	:param jql_str: The JQL query to export.
+	:param batch_size: The number of issues whose changelogs are completed at once.
+	:return: A generator of IssueRecord objects with complete changelogs. Only one batch is held at a time.
+	"""
+	issues = jira_data.iter_search_issues(jira, jql_str, expand='changelog', fields=consts.change_history_fields)
+	for batch in _batches(issues, batch_size):
+		jira_data.complete_changelogs(jira, batch)
+		yield from batch
+
+
+class CsvTimelineWriter:
+	"""Writes timeline rows as CSV with a header row; timestamps are ISO 8601."""
+	
+	def __init__(self, path):
+		self._file = open(path, 'w', newline='', encoding='utf-8')
+		self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS)
+		self._writer.writeheader()
+	
+	def write_rows(self, rows):
+		self._writer.writerows({**row, 'changed_at': row['changed_at'].isoformat()} for row in rows)
+	
+	def close(self):
+		self._file.close()
+
+
+class JsonLinesTimelineWriter:
+	"""Writes one JSON object per timeline row; timestamps are ISO 8601."""
+	
+	def __init__(self, path):
+		self._file = open(path, 'w', encoding='utf-8')
+	
+	def write_rows(self, rows):
+		for row in rows:
+			self._file.write(json.dumps({**row, 'changed_at': row['changed_at'].isoformat()}, ensure_ascii=False))
+			self._file.write('\n')
+	
+	def close(self):
+		self._file.close()
+
+
+class ParquetTimelineWriter:
+	"""Writes each batch of timeline rows as a Parquet row group. Requires pyarrow."""
+	
+	def __init__(self, path):
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+		
+		self._pa = pa
+		self._schema = pa.schema([(column, pa.timestamp('us', tz='UTC') if column == 'changed_at' else pa.string())
+		                          for column in COLUMNS])
+		self._writer = pq.ParquetWriter(path, self._schema)
+	
+	def write_rows(self, rows):
+		rows = list(rows)
+		if rows:
+			self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+	
+	def close(self):
+		self._writer.close()
+
+
+WRITERS = {
+	'csv': CsvTimelineWriter,
+	'jsonl': JsonLinesTimelineWriter,
+	'parquet': ParquetTimelineWriter
+}
+
+
+def open_writer(path, fmt=None):
+	"""
+	:param path: The file to write.
+	:param fmt: One of WRITERS' keys; taken from the file extension when not given.
+	:return: A writer with write_rows(rows) and close().
+	"""
+	fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+	if fmt == 'json':
+		fmt = 'jsonl'
+	if fmt not in WRITERS:
+		raise ValueError(f"Unsupported export format {fmt!r} for {path}, expected one of {', '.join(WRITERS)}")
+	return WRITERS[fmt](path)
+
+
+def export_timeline(issues, path, fmt=None, batch_size=EXPORT_BATCH_SIZE):
+	"""
+	:param issues: An iterable of issues with complete changelogs, e.g. from iter_issues_with_changelogs.
+	:param path: The file to write.
+	:param fmt: The output format; see open_writer.
+	:param batch_size: The number of issues whose rows are written together.
+	:return: The number of rows written.
+	"""
+	n_rows = 0
+	writer = open_writer(path, fmt)
+	try:
+		with metrics.stage('export.timeline', path=path):
+			for batch in _batches(issues, batch_size):
+				rows = [row for issue in batch for row in timeline_rows(issue)]
+				writer.write_rows(rows)
+				n_rows += len(rows)
+	finally:
+		writer.close()
+	metrics.count('export.rows', n_rows)
+	return n_rows
+
+
+def export_query(jql_str, path, fmt=None):
+	"""
+	Streams the issues matched by a query from Jira straight into the export file.
+
+	:param jql_str: The JQL query to export.
+	:param path: The file to write.
+	:param fmt: The output format; see open_writer.
+	:return: The number of rows written.
+	"""
+	return export_timeline(iter_issues_with_changelogs(clients.get_jira(), jql_str), path, fmt)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Export every initiative's Current Status timeline.")
+	parser.add_argument('path', help="output file; .csv, .jsonl or .parquet")
+	parser.add_argument('--jql', default=teams.default_team().filter_jql,
+	                    help="the issues to export (default: the Cloud Platform Red/Yellow filter)")
+	parser.add_argument('--format', choices=sorted(WRITERS), help="override the format implied by the extension")
+	args = parser.parse_args()
+	
+	metrics.configure()
+	print(f"Wrote {export_query(args.jql, args.path, args.format)} rows to {args.path}")
+	metrics.log_summary()
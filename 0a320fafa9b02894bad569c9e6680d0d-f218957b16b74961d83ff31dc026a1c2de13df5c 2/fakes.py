@@ -0,0 +1,342 @@
+"""
+In-process stand-ins for the Jira, Confluence and Slack clients, serving a synthetic portfolio of initiatives. They
+implement only the client methods the report pipeline calls, so the pipeline can be benchmarked without network
+access. Install them with clients.override().
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+WORDS = "initiative rollout blocked pending review capacity milestone dependency cell region latency migration".split()
+# Jira markup the converter rewrites, mixed into the synthetic TLDR/Next Steps text
+MARKUP = ["# ", "+{word}+ ", "CLOUD-{n} ", "[{word}|https://example.com/{word}] "]
+CURRENT_STATUSES = ["🔴 Red", "🟡 Yellow"]
+INITIATIVE_TYPES = ["Eng Local", "Eng Horizontal", "Product"]
+# Fields touched by the synthetic changelog histories, weighted by how often they change
+HISTORY_FIELDS = ["TLDR", "Next Steps", "Current Status", "status", "assignee", "Target Release Month"]
+HISTORY_WEIGHTS = [3, 3, 2, 1, 1, 1]
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.000%z'
+# Jira returns at most this many histories embedded in a search result
+EMBEDDED_HISTORIES = 100
+UPDATED_WITHIN_RE = re.compile(r'updated\s*>=\s*"?-(\d+)m"?')
+
+
+def synthetic_text(rng, n_lines):
+	"""
+	:param rng: The random.Random instance to draw from.
+	:param n_lines: The number of lines to generate.
+	:return: Multi-line text sprinkled with the Jira markup handled by jira_markup.
+	"""
+	lines = []
+	for _ in range(n_lines):
+		words = [rng.choice(WORDS) for _ in range(rng.randint(4, 16))]
+		markup = rng.choice(MARKUP).format(word=rng.choice(WORDS), n=rng.randint(1, 9999))
+		lines.append(markup + ' '.join(words))
+	return '\n'.join(lines)
+
+
+def field_edit(rng, n_lines, edit_ratio=0.1, repeated_lines=()):
+	"""
+	:param rng: The random.Random instance to draw from.
+	:param n_lines: The number of lines in the previous field value.
+	:param edit_ratio: The share of lines that are reworded in the new value.
+	:param repeated_lines: Lines, such as blanks and bullets, that make up a fifth of the text. On long fields they
+	                       become popular enough for difflib's autojunk heuristic.
+	:return: An (old_text, new_text) pair where new_text edits, inserts and drops some of old_text's lines.
+	"""
+	def line():
+		if repeated_lines and rng.random() < 0.2:
+			return rng.choice(repeated_lines)
+		return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 16)))
+	
+	old = [line() for _ in range(n_lines)]
+	new = []
+	for old_line in old:
+		roll = rng.random()
+		if roll < 0.05:
+			continue
+		if roll < 0.05 + edit_ratio:
+			old_line = old_line + ' ' + rng.choice(WORDS) if rng.random() < 0.5 else line()
+		new.append(old_line)
+		if rng.random() < 0.05:
+			new.append(line())
+	return '\n'.join(old), '\n'.join(new)
+
+
+def text_revisions(rng, n_lines, n_revisions):
+	"""
+	:param rng: The random.Random instance to draw from.
+	:param n_lines: The number of lines in each revision.
+	:param n_revisions: The number of revisions to generate.
+	:return: A list of successive values of a text field, each rewording a few lines of the one before and appending
+	         new ones.
+	"""
+	revisions = [synthetic_text(rng, n_lines)]
+	for _ in range(n_revisions - 1):
+		lines = revisions[-1].splitlines()
+		for i in rng.sample(range(len(lines)), min(len(lines), 3)):
+			lines[i] += ' ' + rng.choice(WORDS)
+		lines.extend(synthetic_text(rng, rng.randint(1, 3)).splitlines())
+		revisions.append('\n'.join(lines[-n_lines:]))
+	return revisions
+
+
+def synthetic_issue(number, rng, histories, revisions, authors, timestamps):
+	"""
+	Older TLDR and Next Steps edits reuse the shared revisions so large portfolios stay cheap to generate and hold;
+	the latest edit of each is unique to the issue, so diffing and markup conversion see distinct text per issue.
+
+	:param number: The issue number; the key is INIT-<number>.
+	:param rng: The random.Random instance to draw from.
+	:param histories: The number of changelog histories on the issue.
+	:param revisions: Successive text field values, from text_revisions.
+	:param authors: The author objects histories are attributed to.
+	:param timestamps: Formatted history timestamps, oldest first; the issue's histories are the last `histories`
+	                   of a window ending at a random point in the last three weeks, so some initiatives are stale.
+	:return: The issue JSON as the search API returns it, with its complete changelog.
+	"""
+	key = f"INIT-{number}"
+	end = len(timestamps) - rng.randint(0, 21 * 24)
+	fields = rng.choices(HISTORY_FIELDS, HISTORY_WEIGHTS, k=histories)
+	last_edit = {field: i for i, field in enumerate(fields)}
+	values = {'TLDR': revisions[0], 'Next Steps': revisions[0]}
+	
+	history_list = []
+	for h, field in enumerate(fields):
+		if field in values:
+			revision = rng.randrange(len(revisions) - 1)
+			from_string, to_string = revisions[revision], revisions[revision + 1]
+			if last_edit[field] == h:
+				from_string = values[field]
+				to_string = f"{to_string}\n{key} {field}: {synthetic_text(rng, 1)}"
+			values[field] = to_string
+		elif field == 'Current Status':
+			from_string, to_string = rng.sample(CURRENT_STATUSES, 2)
+		else:
+			from_string, to_string = rng.choice(WORDS), rng.choice(WORDS)
+		history_list.append({
+			'id': str(number * histories + h + 1),
+			'created': timestamps[end - histories + h],
+			'author': rng.choice(authors),
+			'items': [{'field': field, 'fromString': from_string, 'toString': to_string}]
+		})
+	
+	return {
+		'key': key,
+		'fields': {
+			'summary': ' '.join(rng.choice(WORDS) for _ in range(6)),
+			'issuetype': {'name': 'Initiative'},
+			'status': {'name': rng.choice(['In Progress', 'Blocked', 'Discovery'])},
+			'assignee': {'emailAddress': f"owner{rng.randint(1, 50)}@example.com"},
+			'customfield_14218': {'value': rng.choice(CURRENT_STATUSES)},
+			'customfield_13786': values['TLDR'],
+			'customfield_11558': values['Next Steps'],
+			'customfield_14353': {'value': rng.choice(['Oct', 'Nov', 'Dec'])},
+			'customfield_12069': {'value': rng.choice(INITIATIVE_TYPES)},
+			'updated': timestamps[end - 1]
+		},
+		'changelog': {'startAt': 0, 'maxResults': histories, 'total': histories, 'histories': history_list}
+	}
+
+
+def synthetic_portfolio(n_issues, histories=150, text_lines=40, seed=7):
+	"""
+	:param n_issues: The number of initiatives in the portfolio.
+	:param histories: The number of changelog histories on each initiative.
+	:param text_lines: The number of lines in each TLDR and Next Steps field.
+	:param seed: The random seed, so runs are comparable.
+	:return: The list of issue JSON objects.
+	"""
+	rng = random.Random(seed)
+	revisions = text_revisions(rng, text_lines, 64)
+	authors = [{'emailAddress': f"tpm{i}@example.com", 'displayName': f"TPM {i}"} for i in range(1, 21)]
+	# One history an hour, up to now
+	now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+	timestamps = [(now - timedelta(hours=hours)).strftime(DATE_FORMAT) for hours in range(histories + 21 * 24, 0, -1)]
+	return [synthetic_issue(number, rng, histories, revisions, authors, timestamps)
+	        for number in range(1, n_issues + 1)]
+
+
+class FakeService:
+	"""Counts calls per method and optionally sleeps on each one to simulate the round trip."""
+	
+	def __init__(self, latency=0.0):
+		"""
+		:param latency: The seconds each call takes.
+		"""
+		self.latency = latency
+		self.calls = Counter()
+		self._calls_lock = threading.Lock()
+	
+	def _call(self, method):
+		with self._calls_lock:
+			self.calls[method] += 1
+		if self.latency:
+			time.sleep(self.latency)
+
+
+class FakeJira(FakeService):
+	"""
+	Serves a portfolio through search_issues and the changelog endpoint. Any JQL other than `key in (...)` matches
+	the whole portfolio, narrowed by an `updated >= -Nm` clause if it has one. Search results embed at most one page
+	of changelog histories like Jira Cloud.
+	"""
+	
+	def __init__(self, portfolio, latency=0.0):
+		"""
+		:param portfolio: The issue JSON objects to serve, e.g. from synthetic_portfolio.
+		:param latency: The seconds each call takes.
+		"""
+		super().__init__(latency)
+		self.portfolio = portfolio
+		self._by_key = {raw['key']: raw for raw in portfolio}
+		self._lock = threading.Lock()
+	
+	def edit(self, key, field='TLDR', text=None, current_status=None):
+		"""
+		Simulates a user editing an issue now: the field is changed, a history is added and `updated` moves.
+
+		:param key: The key of the issue to edit.
+		:param field: 'TLDR' or 'Next Steps'.
+		:param text: The new field value; a line is appended to the current one when not given.
+		:param current_status: A new Current Status value, e.g. "🟢 Green", recorded in the same history.
+		:return: None
+		"""
+		field_ids = {'TLDR': 'customfield_13786', 'Next Steps': 'customfield_11558'}
+		now = datetime.now(timezone.utc).strftime(DATE_FORMAT)
+		with self._lock:
+			raw = self._by_key[key]
+			fields = raw['fields']
+			old = fields[field_ids[field]]
+			fields[field_ids[field]] = text if text is not None else f"{old}\n{key} edited at {now}"
+			items = [{'field': field, 'fromString': old, 'toString': fields[field_ids[field]]}]
+			if current_status is not None:
+				items.append({'field': 'Current Status', 'fromString': fields['customfield_14218']['value'],
+				              'toString': current_status})
+				fields['customfield_14218'] = {'value': current_status}
+			fields['updated'] = now
+			changelog = raw['changelog']
+			history_id = max(int(history['id']) for history in changelog['histories']) + 1
+			changelog['histories'].append({'id': str(history_id), 'created': now,
+			                               'author': {'emailAddress': "editor@example.com"}, 'items': items})
+			changelog['total'] = changelog['maxResults'] = len(changelog['histories'])
+	
+	def remove(self, key):
+		"""
+		Simulates an issue no longer matching any query, e.g. after turning Green.
+
+		:param key: The key of the issue to drop from the portfolio.
+		:return: None
+		"""
+		with self._lock:
+			self.portfolio = [raw for raw in self.portfolio if raw['key'] != key]
+	
+	def _project(self, raw, fields, expand):
+		issue = {'key': raw['key'], 'fields': {field: value for field, value in raw['fields'].items()
+		                                       if fields is None or field in fields}}
+		if expand and 'changelog' in expand:
+			changelog = raw['changelog']
+			issue['changelog'] = {'startAt': 0, 'maxResults': EMBEDDED_HISTORIES, 'total': changelog['total'],
+			                      'histories': changelog['histories'][:EMBEDDED_HISTORIES]}
+		return issue
+	
+	def search_issues(self, jql_str, startAt=0, maxResults=50, fields=None, expand=None, json_result=False):
+		self._call('search_issues')
+		if jql_str.startswith('key in ('):
+			keys = jql_str[len('key in ('):-1].split(', ')
+			matches = [self._by_key[key] for key in keys if key in self._by_key]
+		else:
+			matches = self.portfolio
+			updated_within = UPDATED_WITHIN_RE.search(jql_str)
+			if updated_within:
+				since = datetime.now(timezone.utc) - timedelta(minutes=int(updated_within.group(1)))
+				matches = [raw for raw in matches
+				           if datetime.strptime(raw['fields']['updated'], '%Y-%m-%dT%H:%M:%S.%f%z') >= since]
+		if isinstance(fields, str):
+			fields = fields.split(',')
+		page = [self._project(raw, fields, expand) for raw in matches[startAt:startAt + maxResults]]
+		return {'startAt': startAt, 'maxResults': maxResults, 'total': len(matches), 'issues': page}
+	
+	def _get_json(self, path, params=None):
+		self._call('changelog')
+		key = path.split('/')[1]
+		start_at = params.get('startAt', 0)
+		histories = self._by_key[key]['changelog']['histories']
+		values = histories[start_at:start_at + params.get('maxResults', EMBEDDED_HISTORIES)]
+		return {'startAt': start_at, 'total': len(histories), 'values': values}
+
+
+class FakeConfluence(FakeService):
+	"""Keeps pages in memory, keyed by title."""
+	
+	def __init__(self, latency=0.0):
+		"""
+		:param latency: The seconds each call takes.
+		"""
+		super().__init__(latency)
+		self.pages = {}
+	
+	def get_page_space(self, page_id):
+		self._call('get_page_space')
+		return 'BENCH'
+	
+	def get_page_by_title(self, space, title, expand=None):
+		self._call('get_page_by_title')
+		return self.pages.get(title)
+	
+	def create_page(self, space, title, body, parent_id=None, representation='storage', full_width=False):
+		self._call('create_page')
+		page = self.pages[title] = {'id': str(len(self.pages) + 1), 'title': title, 'version': {'number': 1},
+		                            'body': {'storage': {'value': body}}}
+		return self._summary(page)
+	
+	def update_page(self, page_id, title, body, parent_id=None, representation='storage', full_width=False,
+	                always_update=False):
+		self._call('update_page')
+		page = self.pages[title]
+		page['body']['storage']['value'] = body
+		page['version']['number'] += 1
+		return self._summary(page)
+	
+	@staticmethod
+	def _summary(page):
+		# Confluence echoes the whole page back; leave out the body so callers printing the response stay readable
+		return {'id': page['id'], 'title': page['title'], 'version': dict(page['version'])}
+
+
+class FakeSlack(FakeService):
+	"""Records every message posted."""
+	
+	def __init__(self, latency=0.0):
+		"""
+		:param latency: The seconds each call takes.
+		"""
+		super().__init__(latency)
+		self.messages = []
+		self._next_ts = 1
+		self._messages_lock = threading.Lock()
+	
+	def chat_postMessage(self, channel, blocks=None, text=None, thread_ts=None):
+		self._call('chat_postMessage')
+		with self._messages_lock:
+			ts = f"{self._next_ts}.000000"
+			self._next_ts += 1
+			self.messages.append({'channel': channel, 'ts': ts, 'thread_ts': thread_ts, 'blocks': blocks})
+		return {'ok': True, 'channel': channel, 'ts': ts}
+	
+	def chat_update(self, channel, ts, blocks=None, text=None):
+		self._call('chat_update')
+		with self._messages_lock:
+			message = next(message for message in self.messages if message['channel'] == channel and message['ts'] == ts)
+			message['blocks'] = blocks
+		return {'ok': True, 'channel': channel, 'ts': ts}
+	
+	def chat_delete(self, channel, ts):
+		self._call('chat_delete')
+		with self._messages_lock:
+			self.messages = [message for message in self.messages
+			                 if not (message['channel'] == channel and message['ts'] == ts)]
+		return {'ok': True, 'channel': channel, 'ts': ts}
@@ -0,0 +1,305 @@
+"""
+Per-review snapshots of each team's initiatives, and the week-over-week delta between them. Each review page keeps
+one columnar JSON file holding every initiative's status and a hash of its TLDR and Next Steps, rewritten whenever
+the page is published, so the next review can tell what changed. Each team keeps at most HISTORY_MAX_RUNS snapshots,
+none older than HISTORY_MAX_AGE_DAYS. Rendered sections are kept in the issue cache instead; see version_hash.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Environment Variables
+# Directory holding one subdirectory of run snapshots per team; an empty HISTORY_DIR disables the store
+HISTORY_DIR = os.getenv("HISTORY_DIR", ".history")
+# Snapshots kept per team, one per review page, so a year of weekly reviews by default; 0 keeps every snapshot
+HISTORY_MAX_RUNS = int(os.getenv("HISTORY_MAX_RUNS", "52"))
+# Snapshots older than this many days are deleted; 0 keeps them regardless of age
+HISTORY_MAX_AGE_DAYS = int(os.getenv("HISTORY_MAX_AGE_DAYS", "0"))
+
+# Constants
+COLUMNS = ['key', 'summary', 'current_status', 'status', 'initiative_type', 'updated', 'tldr_hash',
+           'next_steps_hash']
+# The columns compared between runs, with the names the delta reports them by
+TRACKED_COLUMNS = {
+	'current_status': "Current Status",
+	'status': "Status",
+	'summary': "Summary",
+	'tldr_hash': "TLDR",
+	'next_steps_hash': "Next Steps"
+}
+RUN_FILE_FORMAT = '%Y%m%dT%H%M%S%fZ'
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text):
+	"""
+	:param text: A field value, e.g. the TLDR.
+	:return: A short hash of the text, or None for an empty field.
+	"""
+	if not text:
+		return None
+	return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def section_version(summary, current_status, updated, tldr_hash, next_steps_hash):
+	"""
+	An initiative's page section is rendered from these values alone; updated is the time of the latest TLDR or
+	Next Steps edit, whose added lines the section shows.
+
+	:return: A tuple that changes whenever the initiative's section would.
+	"""
+	return summary, current_status, updated, tldr_hash, next_steps_hash
+
+
+def version_hash(version):
+	"""
+	:param version: A section_version.
+	:return: A short hash of it, stored with the rendered section in the issue cache.
+	"""
+	return text_hash(json.dumps(version))
+
+
+def row_version(row):
+	"""
+	:param row: A row returned by app.get_last_modifier_data.
+	:return: The row's section_version.
+	"""
+	return section_version(row['summary'], row['current_status'], row['updated'], text_hash(row['tldr']),
+	                       text_hash(row['next_steps']))
+
+
+class RunSnapshot:
+	"""One run's initiatives for one team, stored column by column, with an index from issue key to position."""
+	
+	def __init__(self, team_name, page_title, run_at, columns):
+		"""
+		:param team_name: The name of the Team the run was for.
+		:param page_title: The title of the page the run published.
+		:param run_at: The aware datetime of the run.
+		:param columns: A dictionary mapping each of COLUMNS to a list of values, one per initiative.
+		"""
+		self.team_name = team_name
+		self.page_title = page_title
+		self.run_at = run_at
+		self.columns = columns
+		self.index = {key: position for position, key in enumerate(columns['key'])}
+	
+	@classmethod
+	def from_rows(cls, team_name, page_title, rows, run_at=None):
+		"""
+		:param team_name: The name of the Team the run is for.
+		:param page_title: The title of the page the run published.
+		:param rows: The rows returned by app.get_last_modifier_data.
+		:param run_at: The aware datetime of the run; defaults to now.
+		:return: A RunSnapshot of the rows.
+		"""
+		columns = {
+			'key': [row['key'] for row in rows],
+			'summary': [row['summary'] for row in rows],
+			'current_status': [row['current_status'] for row in rows],
+			'status': [row['status'] for row in rows],
+			'initiative_type': [row['initiative_type'] for row in rows],
+			'updated': [row['updated'] for row in rows],
+			'tldr_hash': [text_hash(row['tldr']) for row in rows],
+			'next_steps_hash': [text_hash(row['next_steps']) for row in rows]
+		}
+		return cls(team_name, page_title, run_at or datetime.now(timezone.utc), columns)
+	
+	@property
+	def keys(self):
+		return self.columns['key']
+	
+	def row(self, key):
+		"""
+		:param key: An issue key.
+		:return: A dictionary mapping each of COLUMNS to the initiative's value, or None if it wasn't in the run.
+		"""
+		position = self.index.get(key)
+		if position is None:
+			return None
+		return {column: values[position] for column, values in self.columns.items()}
+	
+	def to_json(self):
+		return {
+			'team': self.team_name,
+			'page_title': self.page_title,
+			'run_at': self.run_at.isoformat(),
+			'columns': self.columns
+		}
+	
+	@classmethod
+	def from_json(cls, data):
+		columns = data['columns']
+		# Snapshots written before a column was added read it as empty, and columns since dropped are ignored
+		n_rows = len(columns['key'])
+		columns = {column: columns.get(column, [None] * n_rows) for column in COLUMNS}
+		return cls(data['team'], data['page_title'], datetime.fromisoformat(data['run_at']), columns)
+
+
+class Delta:
+	"""The initiatives added, removed and changed between two runs."""
+	
+	def __init__(self, new, removed, changed):
+		"""
+		:param new: The keys of initiatives only in the current run, in its order.
+		:param removed: The keys of initiatives only in the previous run, in its order.
+		:param changed: A dictionary mapping the keys of initiatives in both runs to the TRACKED_COLUMNS that
+		                differ, in the current run's order.
+		"""
+		self.new = new
+		self.removed = removed
+		self.changed = changed
+	
+	def __bool__(self):
+		return bool(self.new or self.removed or self.changed)
+
+
+def delta(previous, current):
+	"""
+	:param previous: The RunSnapshot of the previous review.
+	:param current: The RunSnapshot of this run.
+	:return: The Delta from previous to current.
+	"""
+	new = []
+	changed = {}
+	for position, key in enumerate(current.keys):
+		previous_position = previous.index.get(key)
+		if previous_position is None:
+			new.append(key)
+			continue
+		columns = [column for column in TRACKED_COLUMNS
+		           if previous.columns[column][previous_position] != current.columns[column][position]]
+		if columns:
+			changed[key] = columns
+	removed = [key for key in previous.keys if key not in current.index]
+	return Delta(new, removed, changed)
+
+
+class HistoryStore:
+	"""
+	A directory of run snapshots, one subdirectory per team. Each file is named after the time of its run so they
+	list in order. A team keeps one snapshot per review page, the one of its latest publish, and the oldest are
+	deleted as new ones are added.
+	"""
+	
+	def __init__(self, directory=HISTORY_DIR, max_runs=HISTORY_MAX_RUNS, max_age_days=HISTORY_MAX_AGE_DAYS):
+		"""
+		:param directory: The directory the snapshots are kept in; created on first write.
+		:param max_runs: The number of snapshots kept per team; 0 keeps every snapshot.
+		:param max_age_days: Snapshots older than this many days are deleted; 0 keeps them regardless of age.
+		"""
+		self.directory = directory
+		self.max_runs = max_runs
+		self.max_age_days = max_age_days
+	
+	@classmethod
+	def from_env(cls):
+		"""
+		:return: A HistoryStore at HISTORY_DIR, or None if the store is disabled.
+		"""
+		return cls(HISTORY_DIR, HISTORY_MAX_RUNS, HISTORY_MAX_AGE_DAYS) if HISTORY_DIR else None
+	
+	def _team_dir(self, team_name):
+		return os.path.join(self.directory, team_name)
+	
+	def runs(self, team_name):
+		"""
+		:param team_name: The name of a Team.
+		:return: The paths of the team's run snapshots, oldest first.
+		"""
+		try:
+			names = sorted(name for name in os.listdir(self._team_dir(team_name)) if name.endswith('.json'))
+		except FileNotFoundError:
+			return []
+		return [os.path.join(self._team_dir(team_name), name) for name in names]
+	
+	@staticmethod
+	def load(path):
+		"""
+		:param path: The path of a run snapshot.
+		:return: The RunSnapshot stored there.
+		"""
+		with open(path, encoding='utf-8') as f:
+			return RunSnapshot.from_json(json.load(f))
+	
+	def previous(self, team_name, page_title):
+		"""
+		:param team_name: The name of a Team.
+		:param page_title: The title of the page being built; runs that published it are skipped.
+		:return: The latest RunSnapshot of an earlier review page, or None if there is none.
+		"""
+		for path in reversed(self.runs(team_name)):
+			try:
+				snapshot = self.load(path)
+			except (OSError, ValueError, KeyError):
+				logger.warning(f"Skipping unreadable run snapshot {path}")
+				continue
+			if snapshot.page_title != page_title:
+				return snapshot
+		return None
+	
+	def append(self, snapshot):
+		"""
+		Stores the snapshot in place of the team's latest one if that was of the same page, then deletes the team's
+		snapshots beyond max_runs or older than max_age_days. A page republished every hour thus keeps one snapshot
+		and doesn't push out the earlier reviews.
+
+		:param snapshot: The RunSnapshot to store.
+		:return: The path it was written to.
+		"""
+		runs = self.runs(snapshot.team_name)
+		replaced = runs[-1] if runs and self._page_title(runs[-1]) == snapshot.page_title else None
+		team_dir = self._team_dir(snapshot.team_name)
+		os.makedirs(team_dir, exist_ok=True)
+		name = snapshot.run_at.astimezone(timezone.utc).strftime(RUN_FILE_FORMAT) + '.json'
+		path = os.path.join(team_dir, name)
+		tmp_path = path + '.tmp'
+		with open(tmp_path, 'w', encoding='utf-8') as f:
+			json.dump(snapshot.to_json(), f, ensure_ascii=False)
+		os.replace(tmp_path, path)
+		if replaced is not None and replaced != path:
+			os.remove(replaced)
+		self.prune(snapshot.team_name, snapshot.run_at)
+		return path
+	
+	def _page_title(self, path):
+		try:
+			return self.load(path).page_title
+		except (OSError, ValueError, KeyError):
+			return None
+	
+	def prune(self, team_name, now=None):
+		"""
+		:param team_name: The name of a Team.
+		:param now: The time snapshot ages are measured at, as an aware datetime; defaults to now.
+		:return: The paths of the snapshots deleted.
+		"""
+		paths = self.runs(team_name)
+		expired = paths[:-self.max_runs] if self.max_runs else []
+		if self.max_age_days:
+			cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=self.max_age_days)
+			for path in paths[len(expired):]:
+				try:
+					run_at = datetime.strptime(os.path.basename(path)[:-len('.json')], RUN_FILE_FORMAT)
+				except ValueError:
+					# Not written by the store; leave it alone
+					continue
+				if run_at.replace(tzinfo=timezone.utc) < cutoff:
+					expired.append(path)
+		for path in expired:
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				# Already pruned by another run
+				pass
+		if expired:
+			logger.info(f"Pruned {len(expired)} run snapshots of {team_name}")
+		return expired
+
@@ -0,0 +1,182 @@
+"""On-disk cache of Jira issues, their changelogs and the page sections rendered from them, keyed by issue key."""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Environment Variables
+# An empty ISSUE_CACHE_PATH disables the cache
+ISSUE_CACHE_PATH = os.getenv("ISSUE_CACHE_PATH", ".issue_cache.sqlite3")
+# Entries older than this are refetched even if Jira reports no update
+ISSUE_CACHE_TTL_DAYS = float(os.getenv("ISSUE_CACHE_TTL_DAYS", "7"))
+# Entries no query has returned for this long are deleted
+ISSUE_CACHE_EVICT_DAYS = float(os.getenv("ISSUE_CACHE_EVICT_DAYS", "30"))
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+class IssueCache:
+	"""
+	Stores the raw JSON of each issue, including its changelog, together with the issue's `updated` timestamp so a
+	later run can tell which issues changed and fetch only those. Each issue's latest rendered page section is kept
+	with the hash of the values it was rendered from, so a later run renders only the initiatives that changed.
+	"""
+	
+	def __init__(self, path=ISSUE_CACHE_PATH, ttl_days=ISSUE_CACHE_TTL_DAYS, evict_days=ISSUE_CACHE_EVICT_DAYS):
+		"""
+		:param path: The SQLite database file.
+		:param ttl_days: The age in days after which an entry is considered stale.
+		:param evict_days: The number of days an entry may go unseen before it is deleted.
+		"""
+		self.ttl = ttl_days * DAY_SECONDS
+		self.evict_after = evict_days * DAY_SECONDS
+		# Snapshots and the teams rendering pages use the cache from several threads; each call holds the lock
+		self.conn = sqlite3.connect(path, check_same_thread=False)
+		self._lock = threading.Lock()
+		self.conn.execute("""CREATE TABLE IF NOT EXISTS issues (
+			key TEXT PRIMARY KEY,
+			updated TEXT,
+			raw TEXT NOT NULL,
+			fetched_at REAL NOT NULL,
+			seen_at REAL NOT NULL
+		)""")
+		self.conn.execute("""CREATE TABLE IF NOT EXISTS sections (
+			key TEXT PRIMARY KEY,
+			version TEXT NOT NULL,
+			section TEXT NOT NULL,
+			seen_at REAL NOT NULL
+		)""")
+		self.conn.commit()
+	
+	@classmethod
+	def from_env(cls):
+		"""
+		:return: An IssueCache at ISSUE_CACHE_PATH, or None if the cache is disabled.
+		"""
+		return cls() if ISSUE_CACHE_PATH else None
+	
+	def fresh(self, updated_by_key):
+		"""
+		Returns the cached entries that are still current and marks every listed key as seen.
+
+		:param updated_by_key: A dictionary mapping issue keys to the `updated` timestamp Jira reports now.
+		:return: A dictionary mapping issue keys to raw issue JSON for entries whose `updated` matches and which are
+		         within the TTL. Keys missing from the result need to be fetched.
+		"""
+		now = time.time()
+		out = {}
+		keys = list(updated_by_key)
+		with self._lock:
+			# Stay under SQLite's bound-parameter limit
+			for i in range(0, len(keys), 500):
+				batch = keys[i:i + 500]
+				placeholders = ', '.join('?' * len(batch))
+				rows = self.conn.execute(
+					f"SELECT key, updated, raw, fetched_at FROM issues WHERE key IN ({placeholders})", batch)
+				for key, updated, raw, fetched_at in rows:
+					if updated == updated_by_key[key] and now - fetched_at < self.ttl:
+						out[key] = json.loads(raw)
+				self.conn.execute(f"UPDATE issues SET seen_at = ? WHERE key IN ({placeholders})", [now, *batch])
+			self.conn.commit()
+		return out
+	
+	def store(self, raw_issues):
+		"""
+		:param raw_issues: An iterable of raw issue JSON dictionaries, as found in Issue.raw.
+		:return: None
+		"""
+		now = time.time()
+		with self._lock:
+			self.conn.executemany(
+				"INSERT OR REPLACE INTO issues (key, updated, raw, fetched_at, seen_at) VALUES (?, ?, ?, ?, ?)",
+				[(raw['key'], raw['fields'].get('updated'), json.dumps(raw), now, now) for raw in raw_issues])
+			self.conn.commit()
+	
+	def sections(self, version_by_key):
+		"""
+		Returns the stored sections that are still current and marks them as seen.
+
+		:param version_by_key: A dictionary mapping issue keys to the hash of the values their section is rendered
+		                       from now; see history.version_hash.
+		:return: A dictionary mapping issue keys to their stored section, for sections stored under the same hash.
+		"""
+		now = time.time()
+		out = {}
+		keys = list(version_by_key)
+		with self._lock:
+			for i in range(0, len(keys), 500):
+				batch = keys[i:i + 500]
+				placeholders = ', '.join('?' * len(batch))
+				rows = self.conn.execute(f"SELECT key, version, section FROM sections WHERE key IN ({placeholders})",
+				                         batch)
+				for key, version, section in rows:
+					if version == version_by_key[key]:
+						out[key] = section
+				self.conn.execute(f"UPDATE sections SET seen_at = ? WHERE key IN ({placeholders})", [now, *batch])
+			self.conn.commit()
+		return out
+	
+	def store_sections(self, sections):
+		"""
+		:param sections: A dictionary mapping issue keys to (version hash, rendered section) pairs.
+		:return: None
+		"""
+		now = time.time()
+		with self._lock:
+			self.conn.executemany(
+				"INSERT OR REPLACE INTO sections (key, version, section, seen_at) VALUES (?, ?, ?, ?)",
+				[(key, version, section, now) for key, (version, section) in sections.items()])
+			self.conn.commit()
+	
+	def evict(self):
+		"""
+		Deletes issues and sections that no query has returned within the eviction window.
+
+		:return: The number of entries deleted.
+		"""
+		cutoff = time.time() - self.evict_after
+		with self._lock:
+			deleted = sum(self.conn.execute(f"DELETE FROM {table} WHERE seen_at < ?", (cutoff,)).rowcount
+			              for table in ('issues', 'sections'))
+			self.conn.commit()
+		return deleted
+	
+	def clear(self):
+		"""
+		Deletes every entry so the next run rebuilds the cache from Jira.
+
+		:return: None
+		"""
+		with self._lock:
+			self.conn.execute("DELETE FROM issues")
+			self.conn.execute("DELETE FROM sections")
+			self.conn.commit()
+			self.conn.execute("VACUUM")
+	
+	def close(self):
+		with self._lock:
+			self.conn.close()
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Maintain the local Jira issue cache.")
+	parser.add_argument('--rebuild', action='store_true', help="delete every entry; the next run refetches all issues")
+	parser.add_argument('--evict', action='store_true', help="delete entries not seen within ISSUE_CACHE_EVICT_DAYS")
+	args = parser.parse_args()
+	
+	if not ISSUE_CACHE_PATH:
+		print("ISSUE_CACHE_PATH is empty, the cache is disabled")
+	else:
+		cache = IssueCache()
+		if args.rebuild:
+			cache.clear()
+			print(f"Cleared {ISSUE_CACHE_PATH}")
+		if args.evict:
+			print(f"Evicted {cache.evict()} entries")
+		cache.close()
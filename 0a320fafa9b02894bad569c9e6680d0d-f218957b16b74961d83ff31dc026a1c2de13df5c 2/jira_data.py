@@ -0,0 +1,319 @@
+"""Bulk Jira fetch helpers shared by page.py and app.py."""
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import clients
+import metrics
+
+# Page size for search requests; Jira Cloud caps search pages at 100 issues
+PAGE_SIZE = 100
+# Number of pages fetched concurrently after the first one
+SEARCH_WORKERS = 4
+# Page size for the per-issue changelog endpoint
+CHANGELOG_PAGE_SIZE = 100
+
+ORDER_BY_RE = re.compile(r'\s+ORDER\s+BY\s+', flags=re.I)
+
+
+class IssueRecord:
+	"""
+	Lightweight stand-in for jira.resources.Issue built directly from the search JSON. Only the key and the raw
+	dictionary are kept; fields are read from issue.raw['fields'].
+	"""
+	__slots__ = ('key', 'raw', '_changelog_index')
+	
+	def __init__(self, raw):
+		"""
+		:param raw: The issue JSON as returned by the search API.
+		"""
+		self.key = raw['key']
+		self.raw = raw
+
+
+def split_order_by(jql_str):
+	"""
+	:param jql_str: A JQL query, with or without an ORDER BY clause.
+	:return: A (condition, order_by) pair, where order_by is the ' ORDER BY ...' suffix or an empty string, so more
+	         conditions can be added with f"({condition}) AND ...{order_by}".
+	"""
+	match = ORDER_BY_RE.search(jql_str)
+	if match is None:
+		return jql_str.strip(), ''
+	return jql_str[:match.start()].strip(), ' ORDER BY ' + jql_str[match.end():].strip()
+
+
+def _search_page(jira, jql_str, expand, fields, start_at, max_results):
+	# json_result returns the page as plain JSON, skipping the construction of Resource objects
+	with metrics.api_call('jira', 'search'):
+		page = jira.search_issues(jql_str=jql_str, expand=expand, fields=fields, startAt=start_at,
+		                          maxResults=max_results, json_result=True)
+	return [IssueRecord(raw) for raw in page.get('issues', [])], page.get('total', 0)
+
+
+def iter_search_issues(jira, jql_str, expand=None, fields=None, page_size=PAGE_SIZE, max_workers=SEARCH_WORKERS):
+	"""
+	Streams every issue matching a JQL query. The first page is fetched to learn the total, then the remaining
+	pages are requested concurrently while the caller consumes the issues already received.
+
+	:param jira: The JIRA client used to run the searches.
+	:param jql_str: The JQL query to run.
+	:param expand: The expand parameter passed to each search, e.g. 'changelog'.
+	:param fields: The list of fields to return for each issue, e.g. one of the consts.*_fields lists.
+	:param page_size: The number of issues requested per page.
+	:param max_workers: The maximum number of pages in flight at once.
+	:return: A generator of IssueRecord objects in the order returned by the query.
+	"""
+	first_page, total = _search_page(jira, jql_str, expand, fields, 0, page_size)
+	# Jira may return fewer issues per page than requested, so stride by what it actually sent
+	stride = len(first_page) or page_size
+	offsets = deque(range(len(first_page), total, stride)) if first_page else deque()
+	
+	if not offsets:
+		yield from first_page
+		return
+	
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		pending = deque()
+		
+		def fill():
+			# Keep a bounded window of pages in flight so memory stays flat on large result sets
+			while offsets and len(pending) < max_workers:
+				pending.append(executor.submit(_search_page, jira, jql_str, expand, fields, offsets.popleft(), stride))
+		
+		fill()
+		yield from first_page
+		while pending:
+			page, _ = pending.popleft().result()
+			fill()
+			yield from page
+
+
+def fetch_issues_by_key(jira, keys, expand='changelog', fields=None):
+	"""
+	:param jira: The JIRA client used to run the searches.
+	:param keys: An iterable of issue keys to fetch.
+	:param expand: The expand parameter passed to the search.
+	:param fields: The list of fields to return for each issue.
+	:return: A dictionary mapping each issue key to its IssueRecord. Keys that Jira did not return are omitted.
+	"""
+	keys = list(dict.fromkeys(keys))
+	batches = [keys[i:i + PAGE_SIZE] for i in range(0, len(keys), PAGE_SIZE)]
+	
+	def fetch_batch(batch):
+		return list(iter_search_issues(jira, f"key in ({', '.join(batch)})", expand=expand, fields=fields,
+		                                max_workers=1))
+	
+	issues_by_key = {}
+	with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as executor:
+		for issues in executor.map(fetch_batch, batches):
+			for issue in issues:
+				issues_by_key[issue.key] = issue
+	return issues_by_key
+
+
+def _fetch_missing_histories(jira, key, start_at, received, total):
+	# Page through the changelog endpoint, skipping the window the search already embedded
+	histories = []
+	offset = 0
+	while offset < total:
+		if start_at <= offset < start_at + received:
+			offset = start_at + received
+			continue
+		with metrics.api_call('jira', 'changelog'):
+			page = clients.get_changelog_page(jira, key, offset, CHANGELOG_PAGE_SIZE)
+		values = page.get('values', [])
+		if not values:
+			break
+		histories.extend(values)
+		offset += len(values)
+	return histories
+
+
+def complete_changelogs(jira, issues, max_workers=SEARCH_WORKERS):
+	"""
+	Search results embed at most one page of changelog histories per issue. This fetches the missing histories of
+	truncated changelogs from the per-issue changelog endpoint, concurrently across issues, and merges them into
+	the issue objects in place.
+
+	:param jira: The JIRA client used to fetch the changelogs.
+	:param issues: An iterable of IssueRecord (or Issue) objects fetched with expand='changelog'.
+	:param max_workers: The maximum number of issues fetched at once.
+	:return: The number of issues whose changelog was completed.
+	"""
+	truncated = []
+	for issue in issues:
+		changelog = issue.raw.get('changelog')
+		if not changelog:
+			continue
+		histories = changelog.get('histories', [])
+		total = changelog.get('total', len(histories))
+		if len(histories) < total:
+			truncated.append((issue, changelog.get('startAt', 0), len(histories), total))
+	if not truncated:
+		return 0
+	metrics.count('jira.changelogs_completed', len(truncated))
+	
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		futures = [executor.submit(_fetch_missing_histories, jira, issue.key, start_at, received, total)
+		           for issue, start_at, received, total in truncated]
+		for (issue, _, _, _), future in zip(truncated, futures):
+			merged = {history['id']: history for history in issue.raw['changelog'].get('histories', [])}
+			for history in future.result():
+				merged.setdefault(history['id'], history)
+			histories = sorted(merged.values(), key=lambda history: int(history['id']))
+			
+			issue.raw['changelog'] = {'startAt': 0, 'maxResults': len(histories), 'total': len(histories),
+			                          'histories': histories}
+	return len(truncated)
+
+
+class IssueSnapshot:
+	"""
+	Run-scoped view of the issues matched by a set of JQL queries. Each issue is fetched with its changelog at most
+	once, however many of the queries match it, and every consumer in the run reads from the same objects.
+	With an IssueCache, only issues that changed since they were cached are fetched.
+	"""
+	
+	def __init__(self, jira, queries, fields, expand='changelog', cache=None):
+		"""
+		:param jira: The JIRA client used to run the searches.
+		:param queries: The JQL queries whose issues the run needs.
+		:param fields: The fields every consumer of the snapshot reads, e.g. consts.slack_report_fields.
+		:param expand: The expand parameter used when fetching issue details.
+		:param cache: An optional IssueCache holding issues from previous runs.
+		"""
+		self.jira = jira
+		# The cache compares `updated`, so it is always fetched
+		self.fields = list(dict.fromkeys([*fields, 'updated']))
+		self.expand = expand
+		self.cache = cache
+		self._lock = threading.Lock()
+		self._issues = {}
+		self._keys_by_query = {}
+		for query in queries:
+			self.load(query)
+	
+	def load(self, jql_str):
+		"""
+		Adds the issues matched by a query to the snapshot. The first query is fetched in full; later queries only
+		list their keys, and the details of issues not already loaded are fetched in bulk.
+
+		:param jql_str: The JQL query to load.
+		:return: The list of issue keys matched by the query, in query order.
+		"""
+		with self._lock, metrics.stage('snapshot.load'):
+			return self._load(jql_str)
+	
+	def _load(self, jql_str):
+		if jql_str in self._keys_by_query:
+			return self._keys_by_query[jql_str]
+		
+		if self.cache is not None:
+			keys = self._load_through_cache(jql_str)
+		elif not self._issues:
+			issues = list(iter_search_issues(self.jira, jql_str, expand=self.expand, fields=self.fields))
+			complete_changelogs(self.jira, issues)
+			self._issues.update((issue.key, issue) for issue in issues)
+			keys = [issue.key for issue in issues]
+		else:
+			keys = [issue.key for issue in iter_search_issues(self.jira, jql_str, fields=['key'])]
+			missing = [key for key in keys if key not in self._issues]
+			if missing:
+				fetched = fetch_issues_by_key(self.jira, missing, expand=self.expand, fields=self.fields)
+				complete_changelogs(self.jira, fetched.values())
+				self._issues.update(fetched)
+		
+		self._keys_by_query[jql_str] = keys
+		return keys
+	
+	def _load_through_cache(self, jql_str):
+		# List the query's keys with their last update time, then fetch only what the cache can't serve
+		updated_by_key = {issue.key: issue.raw['fields'].get('updated')
+		                  for issue in iter_search_issues(self.jira, jql_str, fields=['updated'])}
+		wanted = {key: updated for key, updated in updated_by_key.items() if key not in self._issues}
+		
+		cached = {}
+		for key, raw in self.cache.fresh(wanted).items():
+			# Entries cached with a narrower projection are refetched
+			if all(field in raw['fields'] for field in self.fields):
+				cached[key] = IssueRecord(raw)
+		self._issues.update(cached)
+		metrics.count('issue_cache.hits', len(cached))
+		metrics.count('issue_cache.misses', len(wanted) - len(cached))
+		
+		fetched = fetch_issues_by_key(self.jira, [key for key in wanted if key not in cached], expand=self.expand,
+		                              fields=self.fields)
+		complete_changelogs(self.jira, fetched.values())
+		self.cache.store(issue.raw for issue in fetched.values())
+		self._issues.update(fetched)
+		return list(updated_by_key)
+	
+	def sync(self, jql_str, updated_within_minutes=None):
+		"""
+		Brings a query's issues up to date, refetching only those whose `updated` differs from the loaded copy.
+		With updated_within_minutes, only the issues the query matches that were updated within that many minutes
+		are listed, which is cheap enough to poll; issues that stopped matching are dropped on the next full sync.
+		Without it the whole query is re-listed and issues no loaded query matches any more are released.
+
+		:param jql_str: The JQL query to sync; it is loaded if it hasn't been.
+		:param updated_within_minutes: Limit the listing to recently updated issues.
+		:return: The set of keys whose details or membership in the query changed.
+		"""
+		with self._lock, metrics.stage('snapshot.sync'):
+			if jql_str not in self._keys_by_query:
+				return set(self._load(jql_str))
+			
+			listing_jql = jql_str
+			if updated_within_minutes is not None:
+				condition, order_by = split_order_by(jql_str)
+				listing_jql = f"({condition}) AND updated >= -{int(updated_within_minutes)}m{order_by}"
+			listed = {issue.key: issue.raw['fields'].get('updated')
+			          for issue in iter_search_issues(self.jira, listing_jql, fields=['updated'])}
+			stale = [key for key, updated in listed.items()
+			         if key not in self._issues or self._issues[key].raw['fields'].get('updated') != updated]
+			if stale:
+				fetched = fetch_issues_by_key(self.jira, stale, expand=self.expand, fields=self.fields)
+				complete_changelogs(self.jira, fetched.values())
+				if self.cache is not None:
+					self.cache.store(issue.raw for issue in fetched.values())
+				self._issues.update(fetched)
+			
+			old_keys = self._keys_by_query[jql_str]
+			if updated_within_minutes is None:
+				keys = list(listed)
+			elif listed.keys() <= set(old_keys):
+				keys = old_keys
+			else:
+				# New matches: list the query's keys to place them in query order
+				keys = [issue.key for issue in iter_search_issues(self.jira, jql_str, fields=['key'])]
+			self._keys_by_query[jql_str] = keys
+			
+			if updated_within_minutes is None:
+				wanted = {key for query_keys in self._keys_by_query.values() for key in query_keys}
+				for key in [key for key in self._issues if key not in wanted]:
+					del self._issues[key]
+			return set(stale) | (set(keys) ^ set(old_keys))
+	
+	def queries(self):
+		"""
+		:return: The list of JQL queries loaded so far.
+		"""
+		with self._lock:
+			return list(self._keys_by_query)
+	
+	def issues(self, jql_str):
+		"""
+		:param jql_str: A JQL query, loaded on first use.
+		:return: The list of IssueRecord objects matched by the query, in query order.
+		"""
+		issues = [self._issues.get(key) for key in self.load(jql_str)]
+		return [issue for issue in issues if issue is not None]
+	
+	def get(self, key):
+		"""
+		:param key: An issue key.
+		:return: The IssueRecord for the key, or None if it is not part of the snapshot.
+		"""
+		return self._issues.get(key)
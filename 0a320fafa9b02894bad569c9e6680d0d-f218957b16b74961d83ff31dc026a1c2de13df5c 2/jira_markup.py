@@ -0,0 +1,77 @@
+"""Conversion of Jira wiki markup in TLDR/Next Steps fields to HTML."""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import metrics
+
+# Number of converted texts kept in memory
+MARKUP_CACHE_SIZE = int(os.getenv("MARKUP_CACHE_SIZE", "2048"))
+
+NUMBERED_HEADING_RE = re.compile(r'# ', flags=re.M)
+UNDERLINE_RE = re.compile(r'\+([^\+]+)\+')
+ISSUE_KEY_RE = re.compile(r'\b([A-Z]+-\d+)\b')
+LINK_RE = re.compile(r'\[([^\|\]]+)\|\s*(http[^\]]+)\]')
+
+
+class JiraMarkupConverter:
+	"""
+	Converts Jira-flavoured markdown to HTML with precompiled patterns and a single reusable Markdown instance, created
+	on first use.
+	Results are memoized by content hash with LRU eviction, so text that hasn't changed is converted only once.
+	"""
+	
+	def __init__(self, cache_size=MARKUP_CACHE_SIZE):
+		"""
+		:param cache_size: The maximum number of converted texts to keep.
+		"""
+		self.cache_size = cache_size
+		self._md = None
+		self._cache = OrderedDict()
+		# Markdown instances are not thread-safe, and page sections render on a worker pool
+		self._lock = threading.Lock()
+	
+	def _convert(self, markdown_text):
+		markdown_text = NUMBERED_HEADING_RE.sub(
+			lambda m, start=[0]: '{}/ '.format(start[0] + 1 if (start := [1])[0] else ""), markdown_text.strip())
+		markdown_text = UNDERLINE_RE.sub(r'<u>\1</u>', markdown_text)
+		markdown_text = ISSUE_KEY_RE.sub(r'[\1](https://confluentinc.atlassian.net/browse/\1)', markdown_text)
+		markdown_text = LINK_RE.sub(r'[\1](\2)', markdown_text)
+		if self._md is None:
+			import markdown
+			
+			self._md = markdown.Markdown(extensions=['extra', 'sane_lists'])
+		return self._md.reset().convert(markdown_text)
+	
+	def _lookup(self, markdown_text):
+		# Must be called with the lock held
+		digest = hashlib.sha1(markdown_text.encode('utf-8')).digest()
+		html = self._cache.get(digest)
+		if html is None:
+			metrics.count('markdown.converted')
+			html = self._convert(markdown_text)
+			self._cache[digest] = html
+			if len(self._cache) > self.cache_size:
+				self._cache.popitem(last=False)
+		else:
+			metrics.count('markdown.cache_hits')
+			self._cache.move_to_end(digest)
+		return html
+	
+	def convert(self, markdown_text):
+		"""
+		:param markdown_text: The markdown text string that needs to be converted.
+		:return: The HTML produced for the text.
+		"""
+		with self._lock:
+			return self._lookup(markdown_text)
+	
+	def convert_many(self, markdown_texts):
+		"""
+		:param markdown_texts: An iterable of markdown text strings.
+		:return: A list of HTML strings in the same order. Repeated texts are converted once.
+		"""
+		with self._lock:
+			return [self._lookup(markdown_text) for markdown_text in markdown_texts]
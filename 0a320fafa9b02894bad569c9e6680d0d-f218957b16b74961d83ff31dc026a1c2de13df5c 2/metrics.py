@@ -0,0 +1,252 @@
+"""
+Stage timers, API call counters and tracing hooks for the report pipeline. Every timed span is aggregated for the
+end-of-run summary, logged at debug level and handed to the registered exporters.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Environment Variables
+# JSON-lines file every finished span is appended to; unset disables the export
+METRICS_EXPORT_PATH = os.getenv("METRICS_EXPORT_PATH")
+# Also record spans with OpenTelemetry when the opentelemetry-api package is installed
+METRICS_OTEL = os.getenv("METRICS_OTEL", "").lower() in ("1", "true", "yes")
+# "json" logs one JSON object per line instead of plain text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+logger = logging.getLogger(__name__)
+
+
+class SpanStats:
+	"""Aggregate timings of every span with the same kind and name."""
+	__slots__ = ('count', 'errors', 'seconds', 'max_seconds')
+	
+	def __init__(self):
+		self.count = 0
+		self.errors = 0
+		self.seconds = 0.0
+		self.max_seconds = 0.0
+	
+	def add(self, seconds, ok):
+		self.count += 1
+		self.errors += not ok
+		self.seconds += seconds
+		self.max_seconds = max(self.max_seconds, seconds)
+
+
+_stats = {}
+_counters = Counter()
+_exporters = []
+_lock = threading.Lock()
+_tracer = None
+
+
+def add_exporter(exporter):
+	"""
+	:param exporter: A callable taking the dictionary describing each finished span.
+	:return: The exporter, so it can be removed later.
+	"""
+	with _lock:
+		_exporters.append(exporter)
+	return exporter
+
+
+def remove_exporter(exporter):
+	"""
+	:param exporter: An exporter previously passed to add_exporter.
+	:return: None
+	"""
+	with _lock:
+		if exporter in _exporters:
+			_exporters.remove(exporter)
+
+
+def _otel_span(name, attributes):
+	global _tracer
+	if not METRICS_OTEL:
+		return nullcontext()
+	if _tracer is None:
+		try:
+			from opentelemetry import trace
+		except ImportError:
+			return nullcontext()
+		_tracer = trace.get_tracer(__name__)
+	return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def _finish(kind, name, seconds, error, attributes):
+	with _lock:
+		stats = _stats.get((kind, name))
+		if stats is None:
+			stats = _stats[(kind, name)] = SpanStats()
+		stats.add(seconds, error is None)
+		exporters = list(_exporters)
+	
+	record = {'kind': kind, 'name': name, 'seconds': round(seconds, 6), 'ok': error is None, 'error': error,
+	          **attributes}
+	logger.debug(f"{kind} {name} finished in {seconds:.3f}s", extra={'span': record})
+	for exporter in exporters:
+		try:
+			exporter(record)
+		except Exception:
+			logger.exception(f"Metrics exporter {exporter!r} failed")
+
+
+@contextmanager
+def span(kind, name, **attributes):
+	"""
+	Times the enclosed block. The span is recorded whether the block returns or raises; exceptions propagate.
+
+	:param kind: The span category, e.g. 'stage' or 'api'.
+	:param name: The span name, e.g. 'page.publish'.
+	:param attributes: Extra values passed to the exporters, e.g. team='cloud-platform'.
+	:return: A context manager.
+	"""
+	error = None
+	start = time.perf_counter()
+	with _otel_span(name, attributes):
+		try:
+			yield
+		except BaseException as e:
+			error = type(e).__name__
+			raise
+		finally:
+			_finish(kind, name, time.perf_counter() - start, error, attributes)
+
+
+def stage(name, **attributes):
+	"""
+	:param name: The pipeline stage, e.g. 'snapshot.load'.
+	:param attributes: Extra values passed to the exporters.
+	:return: A context manager timing the stage.
+	"""
+	return span('stage', name, **attributes)
+
+
+def api_call(service, method, **attributes):
+	"""
+	:param service: The remote service, e.g. 'jira'.
+	:param method: The endpoint or client method, e.g. 'search'.
+	:param attributes: Extra values passed to the exporters.
+	:return: A context manager timing and counting the call.
+	"""
+	return span('api', f"{service}.{method}", service=service, method=method, **attributes)
+
+
+def count(name, n=1):
+	"""
+	:param name: The counter, e.g. 'issue_cache.hits'.
+	:param n: The amount to add.
+	:return: None
+	"""
+	with _lock:
+		_counters[name] += n
+
+
+def snapshot():
+	"""
+	:return: A dictionary with the 'spans' aggregated so far, keyed by (kind, name), and the 'counters'.
+	"""
+	with _lock:
+		spans = {key: {'count': stats.count, 'errors': stats.errors, 'seconds': stats.seconds,
+		               'max_seconds': stats.max_seconds} for key, stats in _stats.items()}
+		return {'spans': spans, 'counters': dict(_counters)}
+
+
+def summary_table():
+	"""
+	Spans of a stage that runs on several threads at once overlap, so their total can exceed the run's wall time.
+
+	:return: The aggregated spans and counters as a plain-text table.
+	"""
+	current = snapshot()
+	lines = [f"{'kind':<6} {'name':<32} {'calls':>7} {'errors':>6} {'total s':>9} {'mean ms':>9} {'max ms':>9}"]
+	for (kind, name), stats in sorted(current['spans'].items()):
+		mean_ms = stats['seconds'] / stats['count'] * 1000
+		lines.append(f"{kind:<6} {name:<32} {stats['count']:>7} {stats['errors']:>6} {stats['seconds']:>9.3f} "
+		             f"{mean_ms:>9.1f} {stats['max_seconds'] * 1000:>9.1f}")
+	for name, value in sorted(current['counters'].items()):
+		lines.append(f"{'count':<6} {name:<32} {value:>7}")
+	return '\n'.join(lines)
+
+
+def log_summary():
+	"""
+	Logs the end-of-run summary table.
+
+	:return: None
+	"""
+	logger.info(f"Run summary:\n{summary_table()}", extra={'summary': snapshot()['counters']})
+
+
+def reset():
+	"""
+	Drops every aggregated span and counter, e.g. between benchmark runs. Exporters stay registered.
+
+	:return: None
+	"""
+	with _lock:
+		_stats.clear()
+		_counters.clear()
+
+
+class JsonLinesExporter:
+	"""Appends each finished span to a file as one JSON object per line."""
+	
+	def __init__(self, path):
+		"""
+		:param path: The file to append to.
+		"""
+		self.path = path
+		self._file = open(path, 'a')
+		self._lock = threading.Lock()
+	
+	def __call__(self, record):
+		line = json.dumps({'time': time.time(), **record})
+		with self._lock:
+			self._file.write(line + '\n')
+			self._file.flush()
+	
+	def close(self):
+		with self._lock:
+			self._file.close()
+
+
+class JsonFormatter(logging.Formatter):
+	"""Formats each log record as a JSON object, including the span or summary attached to it."""
+	
+	def format(self, record):
+		entry = {'time': record.created, 'level': record.levelname, 'logger': record.name,
+		         'message': record.getMessage()}
+		for attribute in ('span', 'summary'):
+			if hasattr(record, attribute):
+				entry[attribute] = getattr(record, attribute)
+		if record.exc_info:
+			entry['exception'] = self.formatException(record.exc_info)
+		return json.dumps(entry, default=str)
+
+
+def configure(level=logging.INFO):
+	"""
+	Sets up logging and the exporters selected by the environment. Each entry point calls this once.
+
+	:param level: The root log level.
+	:return: None
+	"""
+	handler = logging.StreamHandler()
+	if LOG_FORMAT == 'json':
+		handler.setFormatter(JsonFormatter())
+	else:
+		handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+	logging.basicConfig(level=level, handlers=[handler])
+	
+	if METRICS_EXPORT_PATH and not any(isinstance(exporter, JsonLinesExporter) for exporter in _exporters):
+		add_exporter(JsonLinesExporter(METRICS_EXPORT_PATH))
@@ -0,0 +1,114 @@
+"""Slack delivery for the R/Y initiative reminders."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import clients
+import metrics
+
+# Slack rejects messages with more than 50 blocks
+MAX_BLOCKS_PER_MESSAGE = 50
+# Plain-text fallback shown in notifications for block messages
+FALLBACK_TEXT = "R/Y initiatives that need TLDR and Next Steps updates"
+# Shown in place of an edited digest once no initiative is stale
+UP_TO_DATE_TEXT = "All R/Y initiatives have up-to-date TLDR and Next Steps :tada:"
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_blocks(blocks, size=MAX_BLOCKS_PER_MESSAGE):
+	"""
+	:param blocks: The list of Block Kit blocks to send.
+	:param size: The maximum number of blocks per message.
+	:return: A list of block lists, each small enough to post as one message.
+	"""
+	return [blocks[i:i + size] for i in range(0, len(blocks), size)]
+
+
+def post_blocks(channel_id, blocks):
+	"""
+	Posts the blocks to a channel, split into as many messages as Slack requires. The first message goes to the
+	channel and the rest are threaded replies to it, posted in order. Rate-limited calls are retried by the shared
+	client, honoring Retry-After.
+
+	:param channel_id: The ID of the channel to post to.
+	:param blocks: The list of Block Kit blocks to send.
+	:return: The list of chat.postMessage responses.
+	"""
+	client = clients.get_slack()
+	chunks = chunk_blocks(blocks)
+	if not chunks:
+		return []
+	
+	with metrics.api_call('slack', 'chat.postMessage'):
+		responses = [client.chat_postMessage(channel=channel_id, blocks=chunks[0], text=FALLBACK_TEXT)]
+	thread_ts = responses[0]['ts']
+	for chunk in chunks[1:]:
+		with metrics.api_call('slack', 'chat.postMessage'):
+			responses.append(client.chat_postMessage(channel=channel_id, blocks=chunk, text=FALLBACK_TEXT,
+			                                         thread_ts=thread_ts))
+	return responses
+
+
+def update_blocks(channel_id, posted, blocks):
+	"""
+	Brings a digest posted earlier in line with the given blocks. Only messages whose blocks changed are edited;
+	extra chunks are posted as threaded replies and messages no longer needed are deleted. Once no blocks remain,
+	the first message is edited to say everything is up to date. Edits don't notify the channel again.
+
+	:param channel_id: The ID of the channel the digest is in.
+	:param posted: The (ts, blocks) pairs of the digest's messages, first message first; empty if it wasn't posted.
+	:param blocks: The list of Block Kit blocks the digest should show.
+	:return: The digest's new (ts, blocks) pairs.
+	"""
+	if not posted:
+		chunks = chunk_blocks(blocks)
+		return [(response['ts'], chunk) for response, chunk in zip(post_blocks(channel_id, blocks), chunks)]
+	
+	client = clients.get_slack()
+	chunks = chunk_blocks(blocks) or [[{"type": "section", "text": {"type": "mrkdwn", "text": UP_TO_DATE_TEXT}}]]
+	thread_ts = posted[0][0]
+	out = []
+	for i, chunk in enumerate(chunks):
+		if i < len(posted):
+			ts, posted_chunk = posted[i]
+			if chunk != posted_chunk:
+				with metrics.api_call('slack', 'chat.update'):
+					client.chat_update(channel=channel_id, ts=ts, blocks=chunk, text=FALLBACK_TEXT)
+		else:
+			with metrics.api_call('slack', 'chat.postMessage'):
+				ts = client.chat_postMessage(channel=channel_id, blocks=chunk, text=FALLBACK_TEXT,
+				                             thread_ts=thread_ts)['ts']
+		out.append((ts, chunk))
+	for ts, _ in posted[len(chunks):]:
+		with metrics.api_call('slack', 'chat.delete'):
+			client.chat_delete(channel=channel_id, ts=ts)
+	return out
+
+
+def notify_channels(channel_ids, blocks):
+	"""
+	Posts the same blocks to several channels concurrently. A failure in one channel is logged and does not stop
+	the others.
+
+	:param channel_ids: The IDs of the channels to post to.
+	:param blocks: The list of Block Kit blocks to send.
+	:return: A dictionary mapping each channel ID to True if every message was posted.
+	"""
+	from slack_sdk.errors import SlackApiError
+	
+	channel_ids = [channel_id for channel_id in dict.fromkeys(channel_ids) if channel_id]
+	if not channel_ids:
+		return {}
+	
+	results = {}
+	with metrics.stage('slack.notify'), ThreadPoolExecutor(max_workers=len(channel_ids)) as executor:
+		futures = {channel_id: executor.submit(post_blocks, channel_id, blocks) for channel_id in channel_ids}
+		for channel_id, future in futures.items():
+			try:
+				for response in future.result():
+					logger.info(response)
+				results[channel_id] = True
+			except SlackApiError as e:
+				logger.error(f"Error posting message to {channel_id}: {e}")
+				results[channel_id] = False
+	return results
@@ -1,34 +1,46 @@
 import os
-import difflib
-import re
+import hashlib
+import html
+import json
+import logging
+import threading
 import pytz
 import app
+import changelog_index
+import clients
 import consts
+import export
+import history
+import issue_cache
+import jira_data
+import jira_markup
+import metrics
+import page_builder
+import teams
+import text_diff
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from atlassian import Confluence
-from jira import JIRA
-import markdown
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Constants
 PARENT_PAGE_ID = os.getenv("PARENT_PAGE_ID")
+# Number of page sections rendered concurrently
+RENDER_WORKERS = 4
+# Hash of the last body published for each page title, used to skip unchanged updates
+PUBLISH_STATE_PATH = os.getenv("PUBLISH_STATE_PATH", ".publish_state.json")
+# Serializes updates to the publish state file when several pages publish at once
+publish_state_lock = threading.Lock()
 HEADERS = {
 	"Accept": "application/json",
 	"Content-Type": "application/json",
 	"Authorization": f"Basic {os.environ.get('ENCODED_PWD')}"
 }
 
-confluence = Confluence(
-	url='https://confluentinc.atlassian.net',
-	username=os.environ.get("ATLASSIAN_USERNAME"),
-	password=os.environ.get("ATLASSIAN_PASSWORD"),
-	cloud=True
-)
+markup_converter = jira_markup.JiraMarkupConverter()
 
-jira = JIRA('https://confluentinc.atlassian.net',
-            basic_auth=(os.getenv("ATLASSIAN_USERNAME"), os.getenv("ATLASSIAN_PASSWORD")))
+logger = logging.getLogger(__name__)
 
 
 def calculate_next_tuesday(current_date):
@@ -40,21 +52,73 @@ def calculate_next_tuesday(current_date):
 	return current_date + timedelta(days=days_ahead)
 
 
-def create_or_update_page(page_title, body_storage):
+def load_publish_state():
 	"""
+	:return: A dictionary mapping page titles to the hash of the body last published under that title.
+	"""
+	try:
+		with open(PUBLISH_STATE_PATH) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+
+def save_publish_state(state):
+	"""
+	:param state: A dictionary mapping page titles to the hash of the body last published under that title.
+	:return: None
+	"""
+	tmp_path = PUBLISH_STATE_PATH + '.tmp'
+	with open(tmp_path, 'w') as f:
+		json.dump(state, f)
+	os.replace(tmp_path, PUBLISH_STATE_PATH)
+
+
+def create_or_update_page(page_title, body_storage, force=False, parent_page_id=PARENT_PAGE_ID):
+	"""
+	Publishes the page only if its body changed. The body's hash is compared with the one recorded for the title by
+	the last publish; when it matches, no request is made and no new page version is created. The body stored in
+	Confluence isn't compared, since Confluence normalizes storage format and it rarely matches what was sent.
+	Errors from Confluence are raised to the caller once the client's retries are exhausted.
+
 	:param page_title: The title of the Confluence page to be created or updated.
 	:type page_title: str
 	:param body_storage: The storage format body content for the Confluence page.
 	:type body_storage: str
-	:return: None
-	:rtype: None
+	:param force: Publish even if the body is unchanged.
+	:type force: bool
+	:param parent_page_id: The ID of the page to create the page under.
+	:type parent_page_id: str
+	:return: True if the page was published, False if it was unchanged.
+	:rtype: bool
 	"""
-	try:
-		res = confluence.update_or_create(PARENT_PAGE_ID, page_title, body_storage, representation='storage',
-		                                  full_width=True)
-		print(res)
-	except Exception as e:
-		print(e)
+	body_hash = hashlib.sha256(body_storage.encode('utf-8')).hexdigest()
+	if not force and load_publish_state().get(page_title) == body_hash:
+		logger.info(f"Skipping update, {page_title} is unchanged since the last publish")
+		metrics.count('confluence.unchanged_skips')
+		return False
+	
+	with metrics.stage('page.publish', page_title=page_title):
+		confluence = clients.get_confluence()
+		with metrics.api_call('confluence', 'get_page_space'):
+			space = confluence.get_page_space(parent_page_id)
+		with metrics.api_call('confluence', 'get_page_by_title'):
+			page = confluence.get_page_by_title(space, page_title)
+		if page is None:
+			with metrics.api_call('confluence', 'create_page'):
+				res = confluence.create_page(space, page_title, body_storage, parent_id=parent_page_id,
+				                             representation='storage', full_width=True)
+		else:
+			# The body was already compared with the publish state, so skip update_page's own comparison request
+			with metrics.api_call('confluence', 'update_page'):
+				res = confluence.update_page(page['id'], page_title, body_storage, parent_id=parent_page_id,
+				                             representation='storage', full_width=True, always_update=True)
+		with publish_state_lock:
+			publish_state = load_publish_state()
+			publish_state[page_title] = body_hash
+			save_publish_state(publish_state)
+	logger.info(res)
+	return True
 
 
 # Get Changes to a field in the last 4 weeks
@@ -64,21 +128,10 @@ def get_last_4_field_changes(issue, field_name):
 	:param field_name: The name of the field for which to retrieve the last 4 changes.
 	:return: A list of dictionaries containing the date, value, and key of the last 4 changes for the specified field, sorted by date in descending order.
 	"""
-	changelog = issue.changelog
-	changes = []
 	pst = pytz.timezone('America/Los_Angeles')
-	for history in changelog.histories:
-		history_created = datetime.strptime(history.created, '%Y-%m-%dT%H:%M:%S.%f%z')
-		history_created_pst = history_created.astimezone(pst).strftime('%Y-%m-%d %H:%M:%S')
-		for item in history.items:
-			if item.field == field_name and item.toString:
-				changes.append((history_created_pst, item.toString, issue.key))
-	
-	# Sort changes by date in descending order and return the last 4 changes
-	changes.sort(key=lambda x: x[0], reverse=True)
-	# Convert to a list of dictionaries
-	changes = [{'date': change[0], 'value': change[1], 'key': change[2]} for change in changes]
-	return changes[:4]
+	changes = changelog_index.index_for(issue).last(field_name, 4, with_value=True)
+	return [{'date': change.when.astimezone(pst).strftime('%Y-%m-%d %H:%M:%S'), 'value': change.to_string,
+	         'key': issue.key} for change in changes]
 
 
 def get_latest_field_change(issue, field_name):
@@ -87,21 +140,17 @@ def get_latest_field_change(issue, field_name):
 	:param field_name: The name of the field for which the latest change is to be retrieved.
 	:return: A dictionary containing details of the latest change for the specified field, including the issue key, field name, creation timestamp, author's email address, and the from/to values. Returns None if there are no changes for the specified field.
 	"""
-	changelog = issue.changelog
-	latest_change = None
-	for history in changelog.histories:
-		for item in history.items:
-			if item.field == field_name:
-				if latest_change is None or history.created > latest_change['created']:
-					latest_change = {
-						'issue_key': issue.key,
-						'field': item.field,
-						'created': history.created,
-						'author_email': history.author.emailAddress,
-						'from': item.fromString,
-						'to': item.toString
-					}
-	return latest_change
+	change = changelog_index.index_for(issue).latest(field_name)
+	if change is None:
+		return None
+	return {
+		'issue_key': issue.key,
+		'field': field_name,
+		'created': change.created,
+		'author_email': change.author_email,
+		'from': change.from_string,
+		'to': change.to_string
+	}
 
 
 def get_added_markdown_text(issue, field_name):
@@ -112,10 +161,8 @@ def get_added_markdown_text(issue, field_name):
 	"""
 	latest_change = get_latest_field_change(issue, field_name)
 	if latest_change:
-		diff_generator = difflib.ndiff((latest_change['from'] or "").splitlines(),
-		                               (latest_change['to'] or "").splitlines())
-		added_lines = [line[2:] for line in diff_generator if line.startswith('+ ')]
-		return '\n'.join(added_lines)
+		with metrics.stage('diff'):
+			return '\n'.join(text_diff.added_lines(latest_change['from'], latest_change['to']))
 	return ""
 
 
@@ -128,21 +175,13 @@ def convert_markdown_text(markdown_text):
 	    - Convert JIRA-like ticket references to hyperlinks.
 	    - Convert text in the form of [text|url] to standard markdown hyperlinks.
 	"""
-	markdown_text = re.sub(r'# ', lambda m, start=[0]: '{}/ '.format(start[0] + 1 if (start := [1])[0] else ""),
-	                       markdown_text.strip(), flags=re.M)
-	markdown_text = re.sub(r'\+([^\+]+)\+', r'<u>\1</u>', markdown_text)
-	markdown_text = re.sub(
-		r'\b([A-Z]+-\d+)\b',
-		r'[\1](https://confluentinc.atlassian.net/browse/\1)',
-		markdown_text
-	)
-	markdown_text = re.sub(r'\[([^\|\]]+)\|\s*(http[^\]]+)\]', r'[\1](\2)', markdown_text)
-	return markdown.markdown(markdown_text, extensions=['extra', 'sane_lists'])
+	return markup_converter.convert(markdown_text)
 
 
-def process_issue(issue):
+def process_issue(issue, issue_obj=None):
 	"""
 	:param issue: A dictionary containing details of a JIRA issue, including 'initiative_type', 'key', 'current_status', and 'summary'.
+	:param issue_obj: The preloaded Jira issue with its changelog. Fetched individually when not provided.
 	:return: A formatted string containing the issue's initiative type, current status, summary, JIRA link, TLDR, and next steps.
 	"""
 	initiative_type = {
@@ -151,9 +190,14 @@ def process_issue(issue):
 		"Eng Horizontal": "HORIZONTAL"
 	}.get(issue['initiative_type'], "UNKNOWN")
 	
-	issue_obj = jira.issue(issue['key'], expand='changelog,renderedFields')
-	tldr_filtered = convert_markdown_text(get_added_markdown_text(issue_obj, 'TLDR'))
-	next_steps_filtered = convert_markdown_text(get_added_markdown_text(issue_obj, 'Next Steps'))
+	if issue_obj is None:
+		jira = clients.get_jira()
+		with metrics.api_call('jira', 'issue'):
+			issue_obj = jira.issue(issue['key'], fields=','.join(consts.slack_report_fields), expand='changelog')
+		jira_data.complete_changelogs(jira, [issue_obj])
+	added_texts = [get_added_markdown_text(issue_obj, 'TLDR'), get_added_markdown_text(issue_obj, 'Next Steps')]
+	with metrics.stage('markdown'):
+		tldr_filtered, next_steps_filtered = markup_converter.convert_many(added_texts)
 	
 	return f"""
 	    <p>{issue['current_status']} {issue['summary']} | <a href="https://confluentinc.atlassian.net/browse/{issue['key']}">{issue['key']}</a></p><br />
@@ -161,52 +205,199 @@ def process_issue(issue):
 	    <p><strong>Next Steps</strong>: {next_steps_filtered}</p><br />"""
 
 
-def jira_issues_search(query_string):
+def jira_issues_search(query_string, snapshot=None):
 	"""
 	Searches for Jira issues using a specified JQL query, retrieves their changelogs, and extracts
 	the last four changes to the 'Current Status' field along with the summary and the current status of each issue.
 
+	:param query_string: The JQL query to run.
+	:param snapshot: The run's IssueSnapshot. The issues are read from it instead of searching Jira when provided.
 	:return: A list of dictionaries containing the last four field changes to the 'Current Status' of each issue,
 	         along with the summary and the current status.
 	"""
 	out = []
-	start_at = 0
-	max_results = 100
-	
-	while True:
-		issues_Jql = jira.search_issues(jql_str=query_string, expand='changelog', startAt=start_at,
-		                                maxResults=max_results)
-		if not issues_Jql:
-			break
-		for issue in issues_Jql:
-			summary = issue.fields.summary
-			current_status = issue.fields.customfield_14218.value
-			
-			field_change_curr_status = get_last_4_field_changes(issue, 'Current Status')
-			
-			# Append jira summary to the dictionary
-			for change in field_change_curr_status:
-				change['summary'] = summary
-				change['current_status'] = current_status
-			
-			# List of Changes per issue
-			out.append(field_change_curr_status)
+	if snapshot is not None:
+		issues = snapshot.issues(query_string)
+	else:
+		jira = clients.get_jira()
+		issues = list(jira_data.iter_search_issues(jira, query_string, expand='changelog',
+		                                           fields=consts.change_history_fields))
+		jira_data.complete_changelogs(jira, issues)
+	for issue in issues:
+		summary = issue.raw['fields']['summary']
+		current_status = issue.raw['fields']['customfield_14218']['value']
+		
+		field_change_curr_status = get_last_4_field_changes(issue, 'Current Status')
 		
-		start_at += max_results
+		# Append jira summary to the dictionary
+		for change in field_change_curr_status:
+			change['summary'] = summary
+			change['current_status'] = current_status
+		
+		# List of Changes per issue
+		out.append(field_change_curr_status)
 	
 	return out
 
 
-def main():
+def render_change_history_rows(query_string, snapshot=None):
 	"""
-	Main function that generates a page title, processes recent issues, gathers Jira issue statuses,
-	and constructs an HTML report with change history.
+	:param query_string: The JQL query whose issues make up the change history table.
+	:param snapshot: The run's IssueSnapshot, passed through to jira_issues_search.
+	:return: The storage-format table rows with each issue's key, summary, current status and last status changes.
+	"""
+	rows = []
+	issues_list_ryg = jira_issues_search(query_string, snapshot)
+	
+	# Create a table with the following columns: Key, Summary, Current Status Value
+	for issue_field_obj in issues_list_ryg:
+		if issue_field_obj:
+			issue_key = issue_field_obj[0]['key']
+			issue_summary = issue_field_obj[0]['summary']
+			issue_current_status = issue_field_obj[0]['current_status']
+			curr_status_val_list = []
+			for change_obj in issue_field_obj:
+				# Add date and val in one string
+				curr_status_time_raw = change_obj.get('date', 'No Date')
+				curr_status_val = change_obj.get('value', 'No Value')
+				# Extract the date part from datetime string
+				try:
+					curr_status_time = datetime.strptime(curr_status_time_raw, '%Y-%m-%d %H:%M:%S').date().strftime(
+						'%m/%d/%Y')
+				except ValueError:
+					curr_status_time = 'Invalid Date'
+				curr_status_val = "<em>" + curr_status_time + "</em>" + " - " + curr_status_val
+				curr_status_val_list.append(curr_status_val)
+			curr_status_val_bullets = ''.join([f"• {val}<br>" for val in curr_status_val_list])
+			rows.append(f"<tr><td><p><a href=\"https://confluentinc.atlassian.net/browse/{issue_key}\">{issue_key}</p></td><td><p><strong>{issue_summary}</strong></p></td><td><p>{issue_current_status}</p></td><td><p>{curr_status_val_bullets}</p></td></tr>")
+	return ''.join(rows)
+
+
+def review_page_title(team, current_date=None):
+	"""
+	:param team: The Team the page is for.
+	:param current_date: The date the review is prepared on; defaults to now.
+	:return: The page title for the team's next Tuesday review.
+	"""
+	next_tuesday = calculate_next_tuesday(current_date or datetime.now()).strftime('%Y-%m-%d')
+	return f"{team.page_title} - {next_tuesday}"
+
+
+def _failed(future):
+	return future.done() and (future.cancelled() or future.exception() is not None)
+
+
+def render_section(issue, issue_obj, executor, section_cache=None):
+	"""
+	:param issue: A row returned by app.get_last_modifier_data.
+	:param issue_obj: The issue's IssueRecord from the snapshot.
+	:param executor: The worker pool the section is rendered on.
+	:param section_cache: An optional dictionary kept across renders, mapping issue keys to the issue's
+	                      history.row_version and its rendered section. Sections of issues whose summary, status,
+	                      TLDR and Next Steps are unchanged are reused.
+	:return: A Future resolving to the issue's storage-format section.
+	"""
+	version = history.row_version(issue)
+	if section_cache is not None:
+		cached = section_cache.get(issue['key'])
+		# A render that failed is retried rather than reused until the issue changes
+		if cached is not None and cached[0] == version and not _failed(cached[1]):
+			metrics.count('page.sections_reused')
+			return cached[1]
+	section = executor.submit(process_issue, issue, issue_obj)
+	if section_cache is not None:
+		section_cache[issue['key']] = (version, section)
+	return section
+
+
+def load_sections(cache, rows, section_cache=None):
+	"""
+	:param cache: The run's IssueCache, or None.
+	:param rows: The rows the page is rendered from; see app.get_last_modifier_data.
+	:param section_cache: The section cache to add to; see render_section.
+	:return: The section cache, with the sections earlier runs stored for initiatives that haven't changed since and
+	         aren't in it yet.
+	"""
+	section_cache = {} if section_cache is None else section_cache
+	if cache is None:
+		return section_cache
+	versions = {row['key']: history.row_version(row) for row in rows if row['key'] not in section_cache}
+	stored = cache.sections({key: history.version_hash(version) for key, version in versions.items()})
+	for key, section in stored.items():
+		future = Future()
+		future.set_result(section)
+		section_cache[key] = (versions[key], future)
+	return section_cache
+
+
+def save_sections(cache, section_cache):
+	"""
+	:param cache: The run's IssueCache, or None.
+	:param section_cache: The section cache a page was rendered with; sections that failed to render are skipped.
 	:return: None
 	"""
-	current_date = datetime.now()
-	next_tuesday = calculate_next_tuesday(current_date).strftime('%Y-%m-%d')
-	page_title = f"CIP Cloud Platform Execution Review - {next_tuesday}"
-	issues_list_red_yellow = app.get_last_modifier_data()
+	if cache is None:
+		return
+	cache.store_sections({key: (history.version_hash(version), section.result())
+	                      for key, (version, section) in section_cache.items()
+	                      if section.done() and not _failed(section)})
+
+
+def prev_page_link(previous=None):
+	"""
+	:param previous: The history.RunSnapshot of the previous review, if one was recorded.
+	:return: The storage-format paragraph linking the previous review's page.
+	"""
+	if previous is None:
+		return consts.prev_page_link_val
+	return consts.prev_page_link_template.format(title=html.escape(previous.page_title))
+
+
+def render_delta(changes, previous, current):
+	"""
+	:param changes: The history.Delta from the previous review's run to this one.
+	:param previous: The history.RunSnapshot of the previous review.
+	:param current: The history.RunSnapshot of this run.
+	:return: The storage-format list of initiatives added, removed and changed since the previous review.
+	"""
+	heading = "<p><strong><u>Since the last review</u></strong>: "
+	if not changes:
+		return heading + "no initiatives changed</p>"
+	
+	def describe(snapshot, key):
+		row = snapshot.row(key)
+		return f"""<a href="https://confluentinc.atlassian.net/browse/{key}">{key}</a> {row['current_status']} {row['summary']}"""
+	
+	items = [f"<li><p>New: {describe(current, key)}</p></li>" for key in changes.new]
+	items += [f"<li><p>Removed: {describe(previous, key)}</p></li>" for key in changes.removed]
+	for key, columns in changes.changed.items():
+		before, after = previous.row(key), current.row(key)
+		fields = [f"{history.TRACKED_COLUMNS[column]} {before[column]} &rarr; {after[column]}"
+		          if column in ('current_status', 'status') else history.TRACKED_COLUMNS[column] for column in columns]
+		items.append(f"<li><p>Changed: {describe(current, key)} ({', '.join(fields)})</p></li>")
+	return (f"{heading}{len(changes.new)} new, {len(changes.removed)} removed, {len(changes.changed)} changed</p>"
+	        f"<ul>{''.join(items)}</ul>")
+
+
+def build_page_body(team, snapshot, executor, section_cache=None, previous=None, rows=None):
+	"""
+	Renders a team's execution review page from the run's snapshot.
+
+	:param team: The Team the page is for.
+	:param snapshot: The run's IssueSnapshot.
+	:param executor: The worker pool sections are rendered on. It must not be the pool this function runs on.
+	:param section_cache: An optional dictionary of previously rendered sections; see render_section.
+	:param previous: The history.RunSnapshot of the previous review. When given, the page links that review's page
+	                 and lists the initiatives added, removed and changed since.
+	:param rows: The rows app.get_last_modifier_data returns for the team's JQL, if the caller already has them.
+	:return: The storage-format page body.
+	"""
+	with metrics.stage('page.render', team=team.name):
+		return _build_page_body(team, snapshot, executor, section_cache, previous, rows)
+
+
+def _build_page_body(team, snapshot, executor, section_cache, previous, rows):
+	issues_list_red_yellow = rows if rows is not None else app.get_last_modifier_data(snapshot, team.jql)
 	
 	# Group issues by initiative type
 	grouped_issues = {
@@ -219,7 +410,19 @@ def main():
 		if initiative_type in grouped_issues:
 			grouped_issues[initiative_type].append(issue)
 	
-	body_val = consts.page_first_val + consts.table_header_val + consts.table_first_col_val + consts.table_second_col_const
+	builder = page_builder.PageBuilder()
+	builder.add(consts.page_first_template.format(prev_page_link=prev_page_link(previous)))
+	if previous is not None:
+		with metrics.stage('page.delta'):
+			current = history.RunSnapshot.from_rows(team.name, review_page_title(team), issues_list_red_yellow)
+			builder.add(render_delta(history.delta(previous, current), previous, current))
+	# The watcher renders pages all week, so the date is taken at render time
+	date_cell = consts.table_first_col_template.format(date=datetime.now().strftime("%m/%d"))
+	builder.extend([consts.table_header_val, date_cell, team.table_second_col()])
+	
+	# Load the 'Red/Yellow' filter into the snapshot and build its change history rows while the initiative
+	# sections render
+	change_history_rows = executor.submit(render_change_history_rows, team.filter_jql, snapshot)
 	
 	# Preserve order based on initiative type
 	order = ["Eng Local", "Eng Horizontal", "Product"]
@@ -234,43 +437,79 @@ def main():
 			else:
 				heading = "+++{category}+++"
 			# Add the heading once for each initiative type
-			body_val += f"<p><strong>{heading}</strong></p><br/>"
+			builder.add(f"<p><strong>{heading}</strong></p><br/>")
 			for issue in grouped_issues[category]:
-				body_val += process_issue(issue)
-	
-	body_val += f"</td></tr>{consts.table_footer_val}"
-	body_val += consts.change_history_table_header
-	
-	# Get the list of issues that are in the 'Red/Yellow' status
-	query_string = """filter=31272"""
-	issues_list_ryg = jira_issues_search(query_string)
-	
-	# Create a table with the following columns: Key, Summary, Current Status Value
-	for issue_field_obj in issues_list_ryg:
-		if issue_field_obj:
-			issue_key = issue_field_obj[0]['key']
-			issue_summary = issue_field_obj[0]['summary']
-			issue_current_status = issue_field_obj[0]['current_status']
-			curr_status_val_list = []
-			for change_obj in issue_field_obj:
-				# Add date and val in one string
-				curr_status_time_raw = change_obj.get('date', 'No Date')
-				curr_status_val = change_obj.get('value', 'No Value')
-				# Extract the date part from datetime string
-				try:
-					curr_status_time = datetime.strptime(curr_status_time_raw, '%Y-%m-%d %H:%M:%S').date().strftime(
-						'%m/%d/%Y')
-				except ValueError:
-					curr_status_time = 'Invalid Date'
-				curr_status_val = "<em>" + curr_status_time + "</em>" + " - " + curr_status_val
-				curr_status_val_list.append(curr_status_val)
-			curr_status_val_bullets = ''.join([f"• {val}<br>" for val in curr_status_val_list])
-			body_val += f"<tr><td><p><a href=\"https://confluentinc.atlassian.net/browse/{issue_key}\">{issue_key}</p></td><td><p><strong>{issue_summary}</strong></p></td><td><p>{issue_current_status}</p></td><td><p>{curr_status_val_bullets}</p></td></tr>"
-	body_val += consts.change_history_table_footer
+				builder.add(render_section(issue, snapshot.get(issue['key']), executor, section_cache))
 	
-	create_or_update_page(page_title, body_val)
+	builder.add(f"</td></tr>{consts.table_footer_val}")
+	builder.add(consts.change_history_table_header)
+	builder.add(change_history_rows)
+	builder.add(consts.change_history_table_footer)
+	return builder.render()
+
+
+def record_run(store, team, page_title, rows):
+	"""
+	:param store: The history.HistoryStore to append the run to; it replaces the run of an earlier publish of the
+	              same page.
+	:param team: The Team the page is for.
+	:param page_title: The title the page was published under.
+	:param rows: The rows the page was rendered from; see build_page_body.
+	:return: None
+	"""
+	logger.info(f"Recorded run {store.append(history.RunSnapshot.from_rows(team.name, page_title, rows))}")
+
+
+def publish_review(team, snapshot, executor, store=None):
+	"""
+	Builds and publishes a team's review page. Only initiatives that changed since the sections stored in the
+	snapshot's issue cache are rendered. With a history store, the page links the previous review and lists what
+	changed since, and the run is recorded for the next review if the page was published.
+
+	:param team: The Team the page is for.
+	:param snapshot: The run's IssueSnapshot.
+	:param executor: The worker pool sections are rendered on.
+	:param store: The history.HistoryStore runs are kept in, or None.
+	:return: None
+	"""
+	page_title = review_page_title(team)
+	previous = store.previous(team.name, page_title) if store is not None else None
+	rows = app.get_last_modifier_data(snapshot, team.jql)
+	section_cache = load_sections(snapshot.cache, rows)
+	body = build_page_body(team, snapshot, executor, section_cache, previous, rows)
+	save_sections(snapshot.cache, section_cache)
+	published = create_or_update_page(page_title, body, parent_page_id=team.parent_page_id)
+	if store is not None and published:
+		record_run(store, team, page_title, rows)
+
+
+def main():
+	"""
+	Main function that generates a page title, processes recent issues, gathers Jira issue statuses,
+	and constructs an HTML report with change history.
+	:return: None
+	"""
+	team = teams.default_team()
+	# Load issues once and share them across every section of the page
+	cache = issue_cache.IssueCache.from_env()
+	try:
+		snapshot = jira_data.IssueSnapshot(clients.get_jira(), [team.jql], consts.page_report_fields, cache=cache)
+		
+		with ThreadPoolExecutor(max_workers=RENDER_WORKERS) as executor:
+			publish_review(team, snapshot, executor, history.HistoryStore.from_env())
+		
+		if export.STATUS_EXPORT_PATH:
+			# The change history table shows the last 4 changes; the export has each issue's full timeline
+			export.export_timeline(snapshot.issues(team.filter_jql), export.STATUS_EXPORT_PATH)
+	finally:
+		# Publish errors are raised once the client's retries are exhausted; the cache and metrics are still handled
+		if cache is not None:
+			cache.evict()
+			cache.close()
+		metrics.log_summary()
 
 
 if __name__ == '__main__':
+	metrics.configure()
 	main()
 
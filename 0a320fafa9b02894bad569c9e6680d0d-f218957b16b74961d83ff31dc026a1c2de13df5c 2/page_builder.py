@@ -0,0 +1,35 @@
+"""Incremental builder for Confluence storage-format page bodies."""
+from concurrent.futures import Future
+
+
+class PageBuilder:
+	"""
+	Collects the page as a list of fragments and joins them once in render(). A fragment may be a string or a Future
+	resolving to one, so sections can be produced on a worker pool while the rest of the page is still being fetched
+	and assembled; fragments always render in the order they were added.
+	"""
+	
+	def __init__(self):
+		self._fragments = []
+	
+	def add(self, fragment):
+		"""
+		:param fragment: A storage-format string, or a Future that resolves to one.
+		:return: None
+		"""
+		self._fragments.append(fragment)
+	
+	def extend(self, fragments):
+		"""
+		:param fragments: An iterable of storage-format strings or Futures.
+		:return: None
+		"""
+		self._fragments.extend(fragments)
+	
+	def render(self):
+		"""
+		Waits for any pending sections and returns the page body.
+
+		:return: The storage-format body as a single string.
+		"""
+		return ''.join(fragment.result() if isinstance(fragment, Future) else fragment for fragment in self._fragments)
@@ -0,0 +1,234 @@
+"""
+Rate-limit-aware request execution for the Atlassian clients. Every request to a host passes through one shared
+AIMD concurrency limiter: the number of requests in flight grows while responses succeed and halves when Atlassian
+throttles or warns that the limit is near. Throttled and failed requests are retried with jittered exponential
+backoff, or after the delay the server asks for.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Environment Variables
+# Attempts after the first for a throttled or failed request
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "5"))
+# Backoff before retry n is drawn uniformly from [0, min(cap, base * 2^n)] seconds
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "1"))
+HTTP_BACKOFF_CAP = float(os.getenv("HTTP_BACKOFF_CAP", "60"))
+
+# Constants
+# Read-only methods, retried after any failure. Other requests are only retried when rejected with 429, which
+# Atlassian returns before processing the request: a PUT whose response was lost may already have been applied, and
+# Confluence answers a repeated page update with 409 since its version number was already used
+SAFE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+THROTTLED_STATUSES = frozenset([429, 503])
+RETRYABLE_STATUSES = frozenset([429, 500, 502, 503, 504])
+# Share of the concurrency limit kept after a throttled response
+DECREASE_FACTOR = 0.5
+# The limit is decreased at most once per window, so a burst of 429s from requests already in flight counts once
+DECREASE_WINDOW_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+	"""
+	Additive-increase/multiplicative-decrease limit on the number of requests in flight, plus a pause every request
+	waits out after the server sends Retry-After.
+	"""
+	
+	def __init__(self, maximum, minimum=1):
+		"""
+		:param maximum: The largest number of requests allowed in flight, and the starting limit.
+		:param minimum: The smallest limit throttling can reduce it to.
+		"""
+		self.maximum = maximum
+		self.minimum = minimum
+		self.limit = float(maximum)
+		self.in_flight = 0
+		self.paused_until = 0.0
+		self._decrease_after = 0.0
+		self._cond = threading.Condition()
+	
+	def acquire(self):
+		"""
+		Blocks until a request may be sent.
+
+		:return: None
+		"""
+		with self._cond:
+			while True:
+				pause = self.paused_until - time.monotonic()
+				if pause > 0:
+					self._cond.wait(pause)
+				elif self.in_flight < int(self.limit):
+					break
+				else:
+					self._cond.wait()
+			self.in_flight += 1
+	
+	def release(self, throttled=False, succeeded=True):
+		"""
+		:param throttled: The response was throttled or warned that the rate limit is near, or the request failed in
+		                  a way that suggests the host is overloaded.
+		:param succeeded: The request succeeded. Requests that neither succeeded nor were throttled leave the limit
+		                  unchanged.
+		:return: None
+		"""
+		with self._cond:
+			self.in_flight -= 1
+			now = time.monotonic()
+			if not throttled:
+				if succeeded:
+					self.limit = min(self.maximum, self.limit + 1 / self.limit)
+			elif now >= self._decrease_after:
+				self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+				self._decrease_after = now + DECREASE_WINDOW_SECONDS
+				logger.info(f"Throttled, allowing {int(self.limit)} requests in flight")
+			self._cond.notify_all()
+	
+	def pause(self, seconds):
+		"""
+		:param seconds: How long no request may be sent for.
+		:return: None
+		"""
+		with self._cond:
+			self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(host, maximum):
+	"""
+	The Jira and Confluence clients have separate sessions but share the site's rate limit, so limiters are shared
+	per host.
+
+	:param host: The host the requests go to.
+	:param maximum: The limit used when the host's limiter is created.
+	:return: The host's AdaptiveLimiter.
+	"""
+	with _limiters_lock:
+		limiter = _limiters.get(host)
+		if limiter is None:
+			limiter = _limiters[host] = AdaptiveLimiter(maximum)
+		return limiter
+
+
+def _parse_retry_after(value):
+	# Retry-After is either a number of seconds or an HTTP date
+	try:
+		return max(0.0, float(value))
+	except ValueError:
+		pass
+	try:
+		return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+	except (TypeError, ValueError):
+		return None
+
+
+def _parse_reset(value):
+	# X-RateLimit-Reset is an ISO 8601 timestamp
+	try:
+		reset = datetime.fromisoformat(value.replace('Z', '+00:00'))
+	except ValueError:
+		return None
+	if reset.tzinfo is None:
+		reset = reset.replace(tzinfo=timezone.utc)
+	return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+
+
+def server_delay(response):
+	"""
+	:param response: A requests.Response.
+	:return: The seconds the server asked clients to wait, from Retry-After or, once the remaining quota is spent,
+	         X-RateLimit-Reset. None when it didn't say.
+	"""
+	headers = response.headers
+	if 'Retry-After' in headers:
+		return _parse_retry_after(headers['Retry-After'])
+	if headers.get('X-RateLimit-Remaining') == '0' and 'X-RateLimit-Reset' in headers:
+		return _parse_reset(headers['X-RateLimit-Reset'])
+	return None
+
+
+def backoff_delay(attempt, base=HTTP_BACKOFF_BASE, cap=HTTP_BACKOFF_CAP):
+	"""
+	:param attempt: The number of the retry about to be made, starting at 0.
+	:param base: The backoff of the first retry, in seconds.
+	:param cap: The longest backoff, in seconds.
+	:return: A full-jitter exponential backoff, in seconds.
+	"""
+	return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RateLimitedAdapter(HTTPAdapter):
+	"""
+	HTTPAdapter that sends every request through the host's AdaptiveLimiter and retries throttled and failed
+	requests. Retries stop after HTTP_MAX_RETRIES, and the last response or error is returned to the caller.
+	"""
+	
+	def __init__(self, retries=HTTP_MAX_RETRIES, **kwargs):
+		"""
+		:param retries: Attempts after the first for a throttled or failed request.
+		:param kwargs: Passed to HTTPAdapter, e.g. pool_connections and pool_maxsize.
+		"""
+		super().__init__(**kwargs)
+		self.retries = retries
+		self.concurrency = kwargs.get('pool_maxsize', requests.adapters.DEFAULT_POOLSIZE)
+	
+	def send(self, request, **kwargs):
+		host = urlparse(request.url).netloc
+		limiter = limiter_for(host, self.concurrency)
+		safe = request.method in SAFE_METHODS
+		attempt = 0
+		while True:
+			limiter.acquire()
+			throttled = succeeded = False
+			try:
+				response = super().send(request, **kwargs)
+				throttled = response.status_code in THROTTLED_STATUSES or \
+					response.headers.get('X-RateLimit-NearLimit') == 'true'
+				succeeded = response.status_code < 500
+			except (requests.ConnectionError, requests.Timeout):
+				# Refused connections and timeouts mean the host is down or overloaded, so back off as if throttled
+				throttled = True
+				if not safe or attempt >= self.retries:
+					raise
+				response = None
+			finally:
+				limiter.release(throttled, succeeded)
+			
+			if response is not None:
+				if response.status_code in THROTTLED_STATUSES:
+					metrics.count('http.throttled')
+				retryable = response.status_code == 429 or (safe and response.status_code in RETRYABLE_STATUSES)
+				if not retryable or attempt >= self.retries:
+					return response
+				delay = server_delay(response)
+				# Free the connection for the next attempt
+				response.close()
+			else:
+				delay = None
+			
+			metrics.count('http.retries')
+			if delay is None:
+				delay = backoff_delay(attempt)
+				logger.info(f"Retrying {request.method} {request.url} in {delay:.1f}s ({attempt + 1}/{self.retries})")
+				time.sleep(delay)
+			else:
+				# Every request to the host waits out the server's delay in acquire(), including this one
+				logger.info(f"Server asked to wait {delay:.1f}s, retrying {request.method} {request.url} "
+				            f"({attempt + 1}/{self.retries})")
+				limiter.pause(delay)
+			attempt += 1
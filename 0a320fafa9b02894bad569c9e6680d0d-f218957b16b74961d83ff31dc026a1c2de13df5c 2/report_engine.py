@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+"""
+Generates the execution review page and Slack digest for several teams in one run. The union of every team's
+issues is fetched once into a shared snapshot, then each team's page and digest are produced concurrently.
+"""
+import argparse
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import app
+import clients
+import consts
+import history
+import issue_cache
+import jira_data
+import metrics
+import notifier
+import page
+import teams
+
+# Number of teams processed at once
+TEAM_WORKERS = int(os.getenv("TEAM_WORKERS", "4"))
+
+logger = logging.getLogger(__name__)
+
+
+def run_team(team, snapshot, render_pool, publish=True, notify=True, store=None):
+	"""
+	:param team: The Team to report on.
+	:param snapshot: The run's IssueSnapshot, already holding the team's issues.
+	:param render_pool: The shared worker pool page sections are rendered on.
+	:param publish: Publish the team's Confluence page.
+	:param notify: Post the team's Slack digest.
+	:param store: The history.HistoryStore the team's runs are kept in, or None.
+	:return: None
+	"""
+	with metrics.stage('team', team=team.name):
+		_run_team(team, snapshot, render_pool, publish, notify, store)
+
+
+def _run_team(team, snapshot, render_pool, publish, notify, store):
+	if publish:
+		page.publish_review(team, snapshot, render_pool, store)
+	if notify:
+		blocks = app.build_reminder_blocks(app.get_last_modifier_data(snapshot, team.jql), team.slack_mention)
+		if blocks:
+			notifier.notify_channels(team.slack_channel_ids, blocks)
+		else:
+			logger.info(f"{team.name}: no stale initiatives, skipping Slack notification")
+
+
+def run(team_list, publish=True, notify=True):
+	"""
+	:param team_list: The Teams to report on.
+	:param publish: Publish each team's Confluence page.
+	:param notify: Post each team's Slack digest.
+	:return: A dictionary mapping each team name to True if its report completed.
+	"""
+	cache = issue_cache.IssueCache.from_env()
+	try:
+		snapshot = jira_data.IssueSnapshot(clients.get_jira(), [], consts.page_report_fields, cache=cache)
+		# Load every team's queries up front; initiatives shared between teams are fetched only once
+		for team in team_list:
+			snapshot.load(team.jql)
+			snapshot.load(team.filter_jql)
+		
+		store = history.HistoryStore.from_env()
+		results = {}
+		# Teams wait on sections rendered in render_pool, so the two pools must be separate
+		with ThreadPoolExecutor(max_workers=page.RENDER_WORKERS) as render_pool, \
+				ThreadPoolExecutor(max_workers=TEAM_WORKERS) as team_pool:
+			futures = {team.name: team_pool.submit(run_team, team, snapshot, render_pool, publish, notify, store)
+			           for team in team_list}
+			for name, future in futures.items():
+				try:
+					future.result()
+					results[name] = True
+				except Exception:
+					logger.exception(f"Report for {name} failed")
+					results[name] = False
+	finally:
+		if cache is not None:
+			cache.evict()
+			cache.close()
+		metrics.log_summary()
+	return results
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Generate execution review pages and Slack digests for many teams.")
+	parser.add_argument('--config', default=teams.TEAMS_CONFIG,
+	                    help="JSON list of team definitions (default: $TEAMS_CONFIG, or the Cloud Platform team)")
+	parser.add_argument('--no-publish', action='store_true', help="skip publishing Confluence pages")
+	parser.add_argument('--no-notify', action='store_true', help="skip posting Slack digests")
+	args = parser.parse_args()
+	
+	metrics.configure()
+	print(run(teams.load_teams(args.config), publish=not args.no_publish, notify=not args.no_notify))
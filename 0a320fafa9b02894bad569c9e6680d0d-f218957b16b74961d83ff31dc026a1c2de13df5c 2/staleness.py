@@ -0,0 +1,114 @@
+"""Columnar staleness computation for the R/Y initiative reminders."""
+import math
+import os
+from datetime import datetime, timezone
+
+# Environment Variables
+# Initiatives whose TLDR/Next Steps were last edited more than this many whole days ago are stale
+STALE_AFTER_DAYS = int(os.getenv("STALE_AFTER_DAYS", "5"))
+
+DAY_SECONDS = 24 * 60 * 60
+UNASSIGNED = "Unassigned"
+
+
+class StalenessFrame:
+	"""
+	The rows returned by app.get_last_modifier_data as parallel lists: the last TLDR/Next Steps edit as epoch
+	seconds, None for initiatives never edited, and the columns staleness is rolled up by. A team has at most a few
+	hundred R/Y initiatives, so plain lists are fast enough. Compute the ages once with age_days and pass them to
+	stale_mask and rollup, which then make one pass each.
+	"""
+	
+	def __init__(self, keys, updated, assignees, statuses, initiative_types):
+		"""
+		:param keys: The issue keys.
+		:param updated: The epoch seconds of each issue's last TLDR/Next Steps edit, None where there was none.
+		:param assignees: The assignee email addresses, UNASSIGNED where there is none.
+		:param statuses: The Jira workflow statuses.
+		:param initiative_types: The initiative types, e.g. "Eng Local".
+		"""
+		self.keys = list(keys)
+		self.updated = list(updated)
+		self.columns = {
+			'assignee': list(assignees),
+			'status': list(statuses),
+			'initiative_type': list(initiative_types)
+		}
+	
+	@classmethod
+	def from_rows(cls, rows):
+		"""
+		:param rows: The rows returned by app.get_last_modifier_data.
+		:return: A StalenessFrame over the rows, in the same order.
+		"""
+		return cls(
+			keys=[row['key'] for row in rows],
+			updated=[row['updated_at'].timestamp() if row.get('updated_at') else None for row in rows],
+			assignees=[row.get('assignee') or UNASSIGNED for row in rows],
+			statuses=[row.get('status') for row in rows],
+			initiative_types=[row.get('initiative_type') for row in rows]
+		)
+	
+	def __len__(self):
+		return len(self.keys)
+	
+	def age_days(self, now=None):
+		"""
+		:param now: The time ages are measured at, as an aware datetime; defaults to now.
+		:return: A list of whole days since each issue's last edit, None for issues never edited.
+		"""
+		now = (now or datetime.now(timezone.utc)).timestamp()
+		return [None if updated is None else math.floor((now - updated) / DAY_SECONDS) for updated in self.updated]
+	
+	def stale_mask(self, now=None, threshold_days=STALE_AFTER_DAYS, ages=None):
+		"""
+		:param now: The time staleness is measured at, as an aware datetime; defaults to now.
+		:param threshold_days: Issues whose last edit is more than this many whole days old are stale.
+		:param ages: The list returned by age_days; computed at now when not given.
+		:return: A list of booleans, True for stale issues. Issues never edited are stale.
+		"""
+		if ages is None:
+			ages = self.age_days(now)
+		return [age is None or age > threshold_days for age in ages]
+	
+	def rollup(self, column, mask=None, now=None, ages=None):
+		"""
+		:param column: 'assignee', 'status' or 'initiative_type'.
+		:param mask: A list of booleans selecting the rows to roll up, e.g. stale_mask(); all rows when not given.
+		:param now: The time ages are measured at, as an aware datetime; defaults to now.
+		:param ages: The list returned by age_days; computed at now when not given.
+		:return: A list of (value, count, oldest_age_days) tuples, most rows first and then by value. oldest_age_days
+		         is None when a group contains an issue that was never edited.
+		"""
+		values = self.columns[column]
+		if ages is None:
+			ages = self.age_days(now)
+		if mask is None:
+			mask = [True] * len(values)
+		counts = {}
+		# Never-edited issues count as infinitely old, so they mark their group's oldest age
+		oldest = {}
+		for value, age, selected in zip(values, ages, mask):
+			if not selected:
+				continue
+			group = str(value)
+			counts[group] = counts.get(group, 0) + 1
+			age = math.inf if age is None else age
+			oldest[group] = max(oldest.get(group, -math.inf), age)
+		order = sorted(counts, key=lambda group: (-counts[group], group))
+		return [(group, counts[group], None if oldest[group] == math.inf else oldest[group]) for group in order]
+
+
+def rollup_text(rollup, limit=10):
+	"""
+	:param rollup: The list returned by StalenessFrame.rollup.
+	:param limit: The maximum number of groups to list.
+	:return: A short mrkdwn summary, e.g. "a@example.com (3, oldest 12d), b@example.com (1, never updated)".
+	"""
+	parts = []
+	for value, count, oldest in rollup[:limit]:
+		age = "never updated" if oldest is None else f"oldest {oldest}d"
+		parts.append(f"{value} ({count}, {age})")
+	if len(rollup) > limit:
+		parts.append(f"and {len(rollup) - limit} more")
+	return ', '.join(parts)
@@ -0,0 +1,100 @@
+"""Team definitions for the execution review reports."""
+import json
+import os
+
+from dotenv import load_dotenv
+
+import consts
+
+load_dotenv()
+
+# Environment Variables
+# JSON file holding a list of team definitions; the Cloud Platform team is used when unset
+TEAMS_CONFIG = os.getenv("TEAMS_CONFIG")
+
+
+class Team:
+	"""
+	Everything that differs between one org's execution review and another's: the initiatives it covers, where its
+	page is published, who its TPMs are and where its Slack digest goes.
+	"""
+	
+	def __init__(self, name, jql, filter_id, parent_page_id, page_title, heading, tpm_account_ids=(),
+	             slack_channel_ids=(), slack_mention="", tpm_local_ids=None):
+		"""
+		:param name: A short unique name for the team, used in logs.
+		:param jql: The JQL selecting the team's Red/Yellow initiatives.
+		:param filter_id: The saved Jira filter behind the change history table and the page's Jira Reference link.
+		:param parent_page_id: The Confluence page the review pages are created under.
+		:param page_title: The page title prefix; the review date is appended.
+		:param heading: The team heading in the topics table, e.g. "Cloud Platform &mdash; Compute".
+		:param tpm_account_ids: The Atlassian account IDs of the team's TPMs.
+		:param slack_channel_ids: The channels the stale-initiative digest is posted to.
+		:param slack_mention: The mention at the top of the digest, e.g. "<!subteam^S07N03BFDPV>".
+		:param tpm_local_ids: An optional dictionary mapping TPM account IDs to the ri:local-id of their mention on
+		                      the team's pages.
+		"""
+		self.name = name
+		self.jql = jql
+		self.filter_id = filter_id
+		self.parent_page_id = parent_page_id
+		self.page_title = page_title
+		self.heading = heading
+		self.tpm_account_ids = list(tpm_account_ids)
+		self.slack_channel_ids = list(slack_channel_ids)
+		self.slack_mention = slack_mention
+		self.tpm_local_ids = dict(tpm_local_ids or {})
+	
+	@property
+	def filter_jql(self):
+		return f"filter={self.filter_id}"
+	
+	def table_second_col(self):
+		"""
+		:return: The storage-format cell naming the team and its TPMs and linking its Jira filter.
+		"""
+		tpm_links = ' '.join(
+			consts.tpm_link_local_id_template.format(account_id=account_id, local_id=self.tpm_local_ids[account_id])
+			if account_id in self.tpm_local_ids else consts.tpm_link_template.format(account_id=account_id)
+			for account_id in self.tpm_account_ids)
+		return consts.table_second_col_template.format(heading=self.heading, tpm_links=tpm_links,
+		                                               filter_id=self.filter_id)
+	
+	@classmethod
+	def from_dict(cls, definition):
+		return cls(**definition)
+
+
+def default_team():
+	"""
+	:return: The Cloud Platform team the scripts were originally written for.
+	"""
+	channel_ids = os.getenv("NOTIFY_CHANNEL_IDS", os.getenv("TPM_CHANNEL_ID") or "")
+	return Team(
+		name="cloud-platform",
+		jql=consts.query_string,
+		filter_id="31272",
+		parent_page_id=os.getenv("PARENT_PAGE_ID"),
+		page_title="CIP Cloud Platform Execution Review",
+		heading="Cloud Platform &mdash; Control Plane/ Compute / IAO",
+		tpm_account_ids=["60744e43852e71006c5678b2", "712020:57c87adb-4a35-43b2-961a-5121dec7a24e",
+		                 "712020:19c8f7cd-3493-4096-ba83-31101eaa8225"],
+		slack_channel_ids=[channel_id for channel_id in channel_ids.split(",") if channel_id],
+		slack_mention="<!subteam^S07N03BFDPV>",
+		tpm_local_ids={
+			"60744e43852e71006c5678b2": "70df8fe8-c6b5-4e2b-9adb-b7f7f072f9c0",
+			"712020:57c87adb-4a35-43b2-961a-5121dec7a24e": "35ab3d94-3f41-4f59-b1a8-cb34054c81b7",
+			"712020:19c8f7cd-3493-4096-ba83-31101eaa8225": "04985f28-7c40-465f-8bc4-26a2081f96df"
+		}
+	)
+
+
+def load_teams(path=TEAMS_CONFIG):
+	"""
+	:param path: A JSON file containing a list of objects with Team's constructor arguments.
+	:return: The list of Team objects, or the default team alone when no path is given.
+	"""
+	if not path:
+		return [default_team()]
+	with open(path) as f:
+		return [Team.from_dict(definition) for definition in json.load(f)]
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def stand_ins(monkeypatch, tmp_path):
+	"""
+	Serves a small synthetic portfolio from the stand-ins in fakes.py, with the issue cache disabled and the publish
+	state and run history kept in tmp_path.
+
+	:return: The (jira, confluence, slack) stand-ins.
+	"""
+	for module in ("dotenv", "pytz", "markdown"):
+		pytest.importorskip(module)
+	import clients
+	import fakes
+	import history
+	import issue_cache
+	import metrics
+	import page
+	
+	monkeypatch.setattr(issue_cache, 'ISSUE_CACHE_PATH', '')
+	monkeypatch.setattr(history, 'HISTORY_DIR', str(tmp_path / 'history'))
+	monkeypatch.setattr(page, 'PUBLISH_STATE_PATH', str(tmp_path / 'publish_state.json'))
+	stand_ins = (fakes.FakeJira(fakes.synthetic_portfolio(30, histories=20, text_lines=5)), fakes.FakeConfluence(),
+	             fakes.FakeSlack())
+	clients.override(*stand_ins)
+	metrics.reset()
+	yield stand_ins
+	clients.reset()
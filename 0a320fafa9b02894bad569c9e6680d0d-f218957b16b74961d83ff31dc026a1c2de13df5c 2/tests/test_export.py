@@ -0,0 +1,104 @@
+import csv
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import export
+import jira_data
+
+
+def issue(key, statuses):
+	"""
+	:param key: The issue key.
+	:param statuses: The Current Status values the issue moved through, oldest first.
+	:return: An IssueRecord whose changelog has one Current Status change per step, a day apart.
+	"""
+	histories = [{
+		'id': str(i),
+		'created': f"2024-09-{i + 1:02d}T10:00:00.000-0700",
+		'author': {'emailAddress': f"tpm{i}@example.com"},
+		'items': [{'field': 'Current Status', 'fromString': from_status, 'toString': to_status}]
+	} for i, (from_status, to_status) in enumerate(zip([None, *statuses], statuses))]
+	return jira_data.IssueRecord({
+		'key': key,
+		'fields': {'summary': f"Summary of {key}", 'customfield_14218': {'value': statuses[-1]}},
+		'changelog': {'startAt': 0, 'maxResults': len(histories), 'total': len(histories), 'histories': histories}
+	})
+
+
+ISSUES = [issue('INIT-1', ["🟢 Green", "🟡 Yellow", "🔴 Red"]), issue('INIT-2', ["🟡 Yellow"])]
+
+
+def test_timeline_rows_are_oldest_first_in_utc():
+	rows = list(export.timeline_rows(ISSUES[0]))
+	assert [row['to_status'] for row in rows] == ["🟢 Green", "🟡 Yellow", "🔴 Red"]
+	assert [row['from_status'] for row in rows] == [None, "🟢 Green", "🟡 Yellow"]
+	assert rows[0]['changed_at'] == datetime(2024, 9, 1, 17, tzinfo=timezone.utc)
+	assert {row['current_status'] for row in rows} == {"🔴 Red"}
+	assert all(list(row) == export.COLUMNS for row in rows)
+
+
+def test_csv_export(tmp_path):
+	path = tmp_path / 'timeline.csv'
+	assert export.export_timeline(ISSUES, str(path), batch_size=1) == 4
+	with open(path, newline='', encoding='utf-8') as f:
+		rows = list(csv.DictReader(f))
+	assert [row['key'] for row in rows] == ['INIT-1', 'INIT-1', 'INIT-1', 'INIT-2']
+	assert rows[0]['changed_at'] == '2024-09-01T17:00:00+00:00'
+	assert rows[3]['to_status'] == "🟡 Yellow"
+
+
+@pytest.mark.parametrize('suffix', ['jsonl', 'json'])
+def test_json_lines_export(tmp_path, suffix):
+	path = tmp_path / f'timeline.{suffix}'
+	assert export.export_timeline(ISSUES, str(path)) == 4
+	rows = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+	assert [row['to_status'] for row in rows] == ["🟢 Green", "🟡 Yellow", "🔴 Red", "🟡 Yellow"]
+	assert rows[1]['author_email'] == "tpm1@example.com"
+
+
+def test_parquet_export_writes_a_row_group_per_batch(tmp_path):
+	pq = pytest.importorskip("pyarrow.parquet")
+	path = tmp_path / 'timeline.parquet'
+	assert export.export_timeline(ISSUES, str(path), batch_size=1) == 4
+	parquet_file = pq.ParquetFile(path)
+	assert parquet_file.num_row_groups == 2
+	table = parquet_file.read()
+	assert table.column_names == export.COLUMNS
+	assert table.column('changed_at').to_pylist()[0] == datetime(2024, 9, 1, 17, tzinfo=timezone.utc)
+
+
+def test_format_overrides_extension(tmp_path):
+	path = tmp_path / 'timeline.out'
+	export.export_timeline(ISSUES, str(path), fmt='jsonl')
+	assert len(path.read_text(encoding='utf-8').splitlines()) == 4
+
+
+def test_unsupported_format(tmp_path):
+	with pytest.raises(ValueError):
+		export.open_writer(str(tmp_path / 'timeline.xlsx'))
+
+
+def test_issues_are_consumed_lazily(tmp_path, monkeypatch):
+	consumed = []
+	
+	def issues():
+		for record in ISSUES:
+			consumed.append(record.key)
+			yield record
+	
+	writer_rows = []
+	
+	class RecordingWriter:
+		def write_rows(self, rows):
+			writer_rows.append((list(consumed), len(rows)))
+		
+		def close(self):
+			pass
+	
+	monkeypatch.setitem(export.WRITERS, 'recording', lambda path: RecordingWriter())
+	export.export_timeline(issues(), str(tmp_path / 'timeline.recording'), batch_size=1)
+	assert writer_rows == [(['INIT-1'], 3), (['INIT-1', 'INIT-2'], 1)]
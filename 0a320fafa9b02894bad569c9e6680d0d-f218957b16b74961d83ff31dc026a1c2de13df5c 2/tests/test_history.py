@@ -0,0 +1,171 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import history
+
+RUN_AT = datetime(2024, 10, 8, 17, tzinfo=timezone.utc)
+
+
+def row(key, current_status="🔴 Red", tldr="Blocked on the network team", **fields):
+	"""
+	:return: A row shaped like those returned by app.get_last_modifier_data.
+	"""
+	return {'key': key, 'summary': f"Summary of {key}", 'current_status': current_status, 'status': "In Progress",
+	        'initiative_type': "Eng Local", 'updated': "2024-10-07T10:00:00.000-0700", 'tldr': tldr,
+	        'next_steps': "Follow up", **fields}
+
+
+def run(rows, page_title="Review - 2024-10-08", run_at=RUN_AT, team_name="cloud-platform"):
+	return history.RunSnapshot.from_rows(team_name, page_title, rows, run_at=run_at)
+
+
+def test_delta():
+	previous = run([row('A-1'), row('A-2'), row('A-3')])
+	current = run([row('A-4'), row('A-1', current_status="🟡 Yellow"), row('A-2', tldr="Unblocked")])
+	changes = history.delta(previous, current)
+	assert changes.new == ['A-4']
+	assert changes.removed == ['A-3']
+	assert changes.changed == {'A-1': ['current_status'], 'A-2': ['tldr_hash']}
+	assert not history.delta(current, run([row('A-4'), row('A-1', current_status="🟡 Yellow"),
+	                                       row('A-2', tldr="Unblocked")]))
+
+
+def test_snapshot_stores_hashes_not_text(tmp_path):
+	store = history.HistoryStore(str(tmp_path))
+	path = store.append(run([row('A-1')]))
+	with open(path, encoding='utf-8') as f:
+		stored = json.load(f)
+	assert set(stored['columns']) == set(history.COLUMNS)
+	assert "Blocked on the network team" not in json.dumps(stored, ensure_ascii=False)
+	snapshot = store.load(path)
+	assert snapshot.row('A-1')['tldr_hash'] == history.text_hash("Blocked on the network team")
+	assert snapshot.row('A-2') is None
+
+
+def test_snapshots_with_dropped_columns_still_load(tmp_path):
+	data = run([row('A-1')]).to_json()
+	data['columns']['section'] = ["<p>A-1</p>"]
+	del data['columns']['initiative_type']
+	snapshot = history.RunSnapshot.from_json(data)
+	assert set(snapshot.columns) == set(history.COLUMNS)
+	assert snapshot.row('A-1')['initiative_type'] is None
+
+
+def test_previous_skips_runs_of_the_same_page(tmp_path):
+	store = history.HistoryStore(str(tmp_path))
+	assert store.previous('cloud-platform', "Review - 2024-10-15") is None
+	store.append(run([row('A-1')], "Review - 2024-10-01", RUN_AT - timedelta(days=7)))
+	store.append(run([row('A-2')], "Review - 2024-10-08", RUN_AT))
+	store.append(run([row('A-3')], "Review - 2024-10-15", RUN_AT + timedelta(days=1)))
+	store.append(run([row('A-3')], "Review - 2024-10-15", RUN_AT + timedelta(days=2)))
+	assert store.previous('cloud-platform', "Review - 2024-10-15").keys == ['A-2']
+	assert store.previous('cloud-platform', "Review - 2024-10-22").keys == ['A-3']
+	assert store.previous('another-team', "Review - 2024-10-15") is None
+
+
+def test_previous_skips_unreadable_runs(tmp_path):
+	store = history.HistoryStore(str(tmp_path))
+	store.append(run([row('A-1')], "Review - 2024-10-01", RUN_AT - timedelta(days=7)))
+	path = store.append(run([row('A-2')], "Review - 2024-10-08"))
+	with open(path, 'w') as f:
+		f.write('{')
+	assert store.previous('cloud-platform', "Review - 2024-10-15").keys == ['A-1']
+
+
+def test_republishing_a_page_replaces_its_run(tmp_path):
+	store = history.HistoryStore(str(tmp_path), max_runs=52, max_age_days=0)
+	store.append(run([row('A-1')], "Review - 2024-10-01", RUN_AT - timedelta(days=7)))
+	# An hourly cron republishing the current review all week
+	for hour in range(60):
+		store.append(run([row('A-2', tldr=f"Update {hour}")], "Review - 2024-10-08", RUN_AT + timedelta(hours=hour)))
+	assert len(store.runs('cloud-platform')) == 2
+	assert store.previous('cloud-platform', "Review - 2024-10-08").keys == ['A-1']
+	latest = store.previous('cloud-platform', "Review - 2024-10-15")
+	assert latest.row('A-2')['tldr_hash'] == history.text_hash("Update 59")
+
+
+def test_append_keeps_max_runs(tmp_path):
+	store = history.HistoryStore(str(tmp_path), max_runs=3, max_age_days=0)
+	for week in range(5):
+		store.append(run([row('A-1')], f"Review {week}", RUN_AT + timedelta(days=7 * week)))
+	assert [store.load(path).page_title for path in store.runs('cloud-platform')] == ["Review 2", "Review 3",
+	                                                                                   "Review 4"]
+
+
+def test_append_drops_runs_older_than_max_age(tmp_path):
+	store = history.HistoryStore(str(tmp_path), max_runs=0, max_age_days=30)
+	for week in range(8):
+		store.append(run([row('A-1')], f"Review {week}", RUN_AT + timedelta(days=7 * week)))
+	# The last run is 49 days after the first; runs from more than 30 days before it are gone
+	assert [store.load(path).page_title for path in store.runs('cloud-platform')] == [f"Review {week}"
+	                                                                                   for week in range(3, 8)]
+	assert os.listdir(tmp_path) == ['cloud-platform']
+
+
+def test_publish_records_only_published_runs(stand_ins):
+	import clients
+	import consts
+	import jira_data
+	import page
+	import teams
+	
+	jira, confluence, _ = stand_ins
+	team = teams.default_team()
+	store = history.HistoryStore.from_env()
+	with ThreadPoolExecutor(max_workers=2) as executor:
+		for _ in range(2):
+			snapshot = jira_data.IssueSnapshot(clients.get_jira(), [team.jql], consts.page_report_fields)
+			page.publish_review(team, snapshot, executor, store)
+	# The second body was unchanged, so nothing was published and nothing was recorded
+	assert confluence.calls['create_page'] == 1
+	assert confluence.calls['update_page'] == 0
+	assert len(store.runs(team.name)) == 1
+
+
+def test_unchanged_sections_are_not_rendered_again(stand_ins, tmp_path, monkeypatch):
+	import clients
+	import consts
+	import issue_cache
+	import jira_data
+	import page
+	import teams
+	
+	jira, confluence, _ = stand_ins
+	team = teams.default_team()
+	rendered = []
+	process_issue = page.process_issue
+	
+	def recording_process_issue(issue, issue_obj=None):
+		rendered.append(issue['key'])
+		return process_issue(issue, issue_obj)
+	
+	monkeypatch.setattr(page, 'process_issue', recording_process_issue)
+	
+	def publish():
+		# Each run opens its own snapshot and cache, as page.main does
+		cache = issue_cache.IssueCache(str(tmp_path / 'cache.sqlite3'))
+		try:
+			snapshot = jira_data.IssueSnapshot(clients.get_jira(), [team.jql], consts.page_report_fields, cache=cache)
+			with ThreadPoolExecutor(max_workers=2) as executor:
+				page.publish_review(team, snapshot, executor)
+		finally:
+			cache.close()
+		return confluence.pages[page.review_page_title(team)]['body']['storage']['value']
+	
+	body = publish()
+	assert rendered
+	key = rendered[0]
+	rendered.clear()
+	
+	assert publish() == body
+	assert rendered == []
+	
+	jira.edit(key, text="Shipped to every region")
+	assert "Shipped to every region" in publish()
+	assert rendered == [key]
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+import issue_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+	cache = issue_cache.IssueCache(str(tmp_path / 'cache.sqlite3'))
+	yield cache
+	cache.close()
+
+
+def raw_issue(key, updated):
+	return {'key': key, 'fields': {'updated': updated}}
+
+
+def test_fresh_returns_only_unchanged_issues(cache):
+	cache.store([raw_issue('A-1', '2024-10-01'), raw_issue('A-2', '2024-10-01')])
+	fresh = cache.fresh({'A-1': '2024-10-01', 'A-2': '2024-10-02', 'A-3': '2024-10-01'})
+	assert fresh == {'A-1': raw_issue('A-1', '2024-10-01')}
+
+
+def test_sections_are_returned_for_the_same_version_only(cache):
+	cache.store_sections({'A-1': ('v1', "<p>A-1</p>"), 'A-2': ('v1', "<p>A-2</p>")})
+	assert cache.sections({'A-1': 'v1', 'A-2': 'v2', 'A-3': 'v1'}) == {'A-1': "<p>A-1</p>"}
+	cache.store_sections({'A-2': ('v2', "<p>A-2 edited</p>")})
+	assert cache.sections({'A-2': 'v2'}) == {'A-2': "<p>A-2 edited</p>"}
+
+
+def test_evict_drops_unseen_issues_and_sections(tmp_path):
+	cache = issue_cache.IssueCache(str(tmp_path / 'cache.sqlite3'), evict_days=-1)
+	try:
+		cache.store([raw_issue('A-1', '2024-10-01')])
+		cache.store_sections({'A-1': ('v1', "<p>A-1</p>")})
+		assert cache.evict() == 2
+		assert cache.sections({'A-1': 'v1'}) == {}
+		assert cache.fresh({'A-1': '2024-10-01'}) == {}
+	finally:
+		cache.close()
+
+
+def test_clear(cache):
+	cache.store([raw_issue('A-1', '2024-10-01')])
+	cache.store_sections({'A-1': ('v1', "<p>A-1</p>")})
+	cache.clear()
+	assert cache.sections({'A-1': 'v1'}) == {}
+	assert cache.fresh({'A-1': '2024-10-01'}) == {}
@@ -0,0 +1,94 @@
+import copy
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import changelog_index
+import consts
+import fakes
+import jira_data
+
+
+class RecordingJira(fakes.FakeJira):
+	"""Records the (key, startAt) of every changelog page requested."""
+	
+	def __init__(self, portfolio):
+		super().__init__(portfolio)
+		self.changelog_requests = []
+	
+	def _get_json(self, path, params=None):
+		self.changelog_requests.append((path.split('/')[1], params['startAt']))
+		return super()._get_json(path, params)
+
+
+@pytest.fixture
+def jira():
+	portfolio = fakes.synthetic_portfolio(3, histories=250, text_lines=3)
+	assert fakes.EMBEDDED_HISTORIES < 250
+	return RecordingJira(portfolio)
+
+
+def embedded(jira, key, start_at, count):
+	"""
+	:return: An IssueRecord of the issue whose changelog embeds only the histories from start_at to start_at + count.
+	"""
+	raw = copy.deepcopy(jira._by_key[key])
+	histories = raw['changelog']['histories']
+	raw['changelog'] = {'startAt': start_at, 'maxResults': count, 'total': len(histories),
+	                    'histories': histories[start_at:start_at + count]}
+	return jira_data.IssueRecord(raw)
+
+
+def full_ids(jira, key):
+	return [history['id'] for history in jira._by_key[key]['changelog']['histories']]
+
+
+def test_search_results_are_completed(jira):
+	issues = list(jira_data.iter_search_issues(jira, consts.query_string, expand='changelog', max_workers=1))
+	assert all(len(issue.raw['changelog']['histories']) == fakes.EMBEDDED_HISTORIES for issue in issues)
+	assert jira_data.complete_changelogs(jira, issues) == 3
+	# The first page was embedded, so only the two after it are requested for each issue
+	assert sorted(jira.changelog_requests) == [(key, offset) for key in ('INIT-1', 'INIT-2', 'INIT-3')
+	                                           for offset in (100, 200)]
+	for issue in issues:
+		changelog = issue.raw['changelog']
+		assert [history['id'] for history in changelog['histories']] == full_ids(jira, issue.key)
+		assert changelog['startAt'] == 0 and changelog['total'] == 250
+
+
+def test_only_missing_offsets_are_requested(jira):
+	issue = embedded(jira, 'INIT-2', 100, 100)
+	jira_data.complete_changelogs(jira, [issue])
+	assert jira.changelog_requests == [('INIT-2', 0), ('INIT-2', 200)]
+	assert [history['id'] for history in issue.raw['changelog']['histories']] == full_ids(jira, 'INIT-2')
+
+
+def test_overlapping_pages_are_deduplicated_and_sorted(jira):
+	# The first page fetched overlaps the embedded window by 50 histories
+	issue = embedded(jira, 'INIT-1', 50, 100)
+	jira_data.complete_changelogs(jira, [issue])
+	assert jira.changelog_requests == [('INIT-1', 0), ('INIT-1', 150)]
+	ids = [history['id'] for history in issue.raw['changelog']['histories']]
+	assert ids == full_ids(jira, 'INIT-1')
+	assert ids == sorted(set(ids), key=int)
+
+
+def test_complete_changelogs_are_left_alone(jira):
+	issue = jira_data.IssueRecord(copy.deepcopy(jira._by_key['INIT-3']))
+	assert jira_data.complete_changelogs(jira, [issue]) == 0
+	assert jira.changelog_requests == []
+
+
+def test_index_is_rebuilt_after_the_merge(jira):
+	issue = embedded(jira, 'INIT-3', 0, 100)
+	truncated_index = changelog_index.index_for(issue)
+	assert len(truncated_index.changes('Current Status')) < 250
+	jira_data.complete_changelogs(jira, [issue])
+	index = changelog_index.index_for(issue)
+	assert index is not truncated_index
+	assert index.source is issue.raw['changelog']['histories']
+	expected = changelog_index.ChangelogIndex('INIT-3', jira._by_key['INIT-3']['changelog']['histories'])
+	for field in ('TLDR', 'Next Steps', 'Current Status'):
+		assert [change.created for change in index.changes(field)] == \
+		       [change.created for change in expected.changes(field)]
@@ -0,0 +1,203 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+requests = pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+
+import rate_limit
+
+
+class FakeResponse:
+	def __init__(self, headers):
+		self.headers = headers
+
+
+def test_success_increases_limit_up_to_maximum():
+	limiter = rate_limit.AdaptiveLimiter(maximum=4)
+	limiter.limit = 2.0
+	for _ in range(2):
+		limiter.acquire()
+		limiter.release()
+	assert limiter.limit == pytest.approx(2.0 + 1 / 2 + 1 / 2.5)
+	limiter.limit = 4.0
+	limiter.acquire()
+	limiter.release()
+	assert limiter.limit == 4.0
+
+
+def test_throttling_halves_limit_once_per_window():
+	limiter = rate_limit.AdaptiveLimiter(maximum=8)
+	for _ in range(3):
+		limiter.acquire()
+	for _ in range(3):
+		limiter.release(throttled=True)
+	assert limiter.limit == 4.0
+	assert limiter.in_flight == 0
+
+
+def test_throttling_stops_at_minimum():
+	limiter = rate_limit.AdaptiveLimiter(maximum=2, minimum=1)
+	for _ in range(3):
+		limiter._decrease_after = 0.0
+		limiter.acquire()
+		limiter.release(throttled=True)
+	assert limiter.limit == 1.0
+
+
+def test_failure_leaves_limit_unchanged():
+	limiter = rate_limit.AdaptiveLimiter(maximum=8)
+	limiter.limit = 3.0
+	limiter.acquire()
+	limiter.release(succeeded=False)
+	assert limiter.limit == 3.0
+
+
+def test_acquire_blocks_at_limit():
+	limiter = rate_limit.AdaptiveLimiter(maximum=1)
+	limiter.acquire()
+	acquired = threading.Event()
+	
+	def second():
+		limiter.acquire()
+		acquired.set()
+	
+	threading.Thread(target=second, daemon=True).start()
+	assert not acquired.wait(0.1)
+	limiter.release()
+	assert acquired.wait(1)
+
+
+def test_pause_delays_acquire():
+	limiter = rate_limit.AdaptiveLimiter(maximum=4)
+	limiter.pause(0.2)
+	started = time.monotonic()
+	limiter.acquire()
+	assert time.monotonic() - started >= 0.15
+
+
+def test_server_delay_reads_retry_after_seconds():
+	assert rate_limit.server_delay(FakeResponse({'Retry-After': '7'})) == 7.0
+
+
+def test_server_delay_reads_retry_after_date():
+	when = datetime.now(timezone.utc) + timedelta(seconds=30)
+	delay = rate_limit.server_delay(FakeResponse({'Retry-After': format_datetime(when, usegmt=True)}))
+	assert 25 <= delay <= 30
+
+
+def test_server_delay_reads_reset_once_quota_is_spent():
+	reset = (datetime.now(timezone.utc) + timedelta(seconds=20)).isoformat().replace('+00:00', 'Z')
+	assert 15 <= rate_limit.server_delay(FakeResponse({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': reset})) <= 20
+	assert rate_limit.server_delay(FakeResponse({'X-RateLimit-Remaining': '3', 'X-RateLimit-Reset': reset})) is None
+	assert rate_limit.server_delay(FakeResponse({})) is None
+
+
+def test_backoff_delay_is_capped():
+	for attempt in range(10):
+		assert 0 <= rate_limit.backoff_delay(attempt, base=1, cap=5) <= 5
+
+
+@pytest.fixture
+def server():
+	"""Serves the responses queued per path; a path with nothing queued answers 200."""
+	queued = {}
+	received = []
+	
+	class Handler(BaseHTTPRequestHandler):
+		def respond(self):
+			received.append((self.command, self.path))
+			status, headers = queued.get(self.path, []).pop(0) if queued.get(self.path) else (200, {})
+			self.send_response(status)
+			for name, value in headers.items():
+				self.send_header(name, value)
+			self.send_header('Content-Length', '0')
+			self.end_headers()
+		
+		do_GET = do_POST = do_PUT = respond
+		
+		def log_message(self, format, *args):
+			pass
+	
+	httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+	threading.Thread(target=httpd.serve_forever, daemon=True).start()
+	yield f"http://127.0.0.1:{httpd.server_address[1]}", queued, received
+	httpd.shutdown()
+
+
+@pytest.fixture
+def session(monkeypatch):
+	monkeypatch.setattr(rate_limit, 'backoff_delay', lambda attempt: 0.0)
+	session = requests.Session()
+	session.mount('http://', rate_limit.RateLimitedAdapter(retries=3, pool_connections=4, pool_maxsize=4))
+	return session
+
+
+def test_throttled_request_waits_out_retry_after(server, session):
+	url, queued, received = server
+	queued['/search'] = [(429, {'Retry-After': '0.3'})]
+	started = time.monotonic()
+	assert session.get(url + '/search').status_code == 200
+	assert time.monotonic() - started >= 0.25
+	assert len(received) == 2
+	# Halved by the 429, then raised by 1/limit for the successful retry
+	assert rate_limit.limiter_for(url[len('http://'):], 4).limit == 2.5
+
+
+def test_server_errors_are_retried_for_reads_only(server, session):
+	url, queued, received = server
+	queued['/page'] = [(503, {}), (502, {})]
+	assert session.get(url + '/page').status_code == 200
+	queued['/create'] = [(500, {})]
+	assert session.post(url + '/create').status_code == 500
+	assert received.count(('POST', '/create')) == 1
+	# A page update may have been applied before the error, so it isn't sent again
+	queued['/update'] = [(502, {})]
+	assert session.put(url + '/update').status_code == 502
+	assert received.count(('PUT', '/update')) == 1
+
+
+def test_throttled_writes_are_retried(server, session):
+	url, queued, received = server
+	queued['/update'] = [(429, {'Retry-After': '0'})]
+	assert session.put(url + '/update').status_code == 200
+	assert received.count(('PUT', '/update')) == 2
+
+
+def test_retries_stop_at_the_limit(server, session):
+	url, queued, received = server
+	queued['/down'] = [(503, {})] * 10
+	assert session.get(url + '/down').status_code == 503
+	assert len(received) == 4
+
+
+def test_connection_errors_are_not_retried_for_writes(session, monkeypatch):
+	sent = []
+	
+	def refuse(self, request, **kwargs):
+		sent.append(request.method)
+		raise requests.ConnectionError("refused")
+	
+	monkeypatch.setattr(requests.adapters.HTTPAdapter, 'send', refuse)
+	with pytest.raises(requests.ConnectionError):
+		session.put("http://127.0.0.1:1/update")
+	assert sent == ['PUT']
+	with pytest.raises(requests.ConnectionError):
+		session.get("http://127.0.0.1:1/page")
+	assert sent == ['PUT'] + ['GET'] * 4
+
+
+def test_connection_errors_lower_the_limit(session):
+	# Nothing listens on the port once the probe socket is closed
+	probe = ThreadingHTTPServer(('127.0.0.1', 0), BaseHTTPRequestHandler)
+	port = probe.server_address[1]
+	probe.server_close()
+	with pytest.raises(requests.ConnectionError):
+		session.get(f"http://127.0.0.1:{port}/")
+	limiter = rate_limit.limiter_for(f"127.0.0.1:{port}", 4)
+	assert limiter.limit < 4
+	assert limiter.in_flight == 0
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import staleness
+
+NOW = datetime(2024, 10, 14, 12, tzinfo=timezone.utc)
+
+
+def row(key, age=None, assignee=None, status="In Progress", initiative_type="Eng Local"):
+	"""
+	:param age: The timedelta since the issue's last TLDR/Next Steps edit, or None if it was never edited.
+	:return: A row shaped like those returned by app.get_last_modifier_data.
+	"""
+	return {'key': key, 'updated_at': NOW - age if age is not None else None, 'assignee': assignee, 'status': status,
+	        'initiative_type': initiative_type}
+
+
+def test_age_is_whole_days_and_none_when_never_edited():
+	frame = staleness.StalenessFrame.from_rows([
+		row('A-1', timedelta(days=2, hours=23)), row('A-2', timedelta(hours=1)), row('A-3')
+	])
+	assert frame.age_days(NOW) == [2, 0, None]
+	assert len(frame) == 3
+
+
+@pytest.mark.parametrize('age, stale', [
+	(timedelta(days=5, hours=23), False),
+	(timedelta(days=6), True),
+	(None, True)
+])
+def test_stale_after_more_than_threshold_whole_days(age, stale):
+	frame = staleness.StalenessFrame.from_rows([row('A-1', age)])
+	assert frame.stale_mask(NOW, threshold_days=5) == [stale]
+
+
+def test_rollup_orders_by_count_then_value():
+	frame = staleness.StalenessFrame.from_rows([
+		row('A-1', timedelta(days=9), "b@example.com"),
+		row('A-2', timedelta(days=12), "b@example.com"),
+		row('A-3', timedelta(days=7), "c@example.com"),
+		row('A-4', timedelta(days=8), "a@example.com"),
+		row('A-5', timedelta(days=1), "a@example.com")
+	])
+	assert frame.rollup('assignee', now=NOW) == [
+		("a@example.com", 2, 8), ("b@example.com", 2, 12), ("c@example.com", 1, 7)
+	]
+	assert frame.rollup('assignee', frame.stale_mask(NOW, threshold_days=5), NOW) == [
+		("b@example.com", 2, 12), ("a@example.com", 1, 8), ("c@example.com", 1, 7)
+	]
+
+
+def test_rollup_marks_groups_with_never_edited_issues():
+	frame = staleness.StalenessFrame.from_rows([
+		row('A-1', timedelta(days=30), status="Backlog"), row('A-2', status="Backlog"),
+		row('A-3', timedelta(days=6), assignee="a@example.com")
+	])
+	assert frame.rollup('status', now=NOW) == [("Backlog", 2, None), ("In Progress", 1, 6)]
+	assert frame.rollup('assignee', now=NOW)[0] == (staleness.UNASSIGNED, 2, None)
+	assert frame.rollup('status', [False, False, False], NOW) == []
+
+
+def test_rollup_text():
+	rollup = [("a@example.com", 3, 12), ("b@example.com", 1, None), ("c@example.com", 1, 6)]
+	assert staleness.rollup_text(rollup) == \
+	       "a@example.com (3, oldest 12d), b@example.com (1, never updated), c@example.com (1, oldest 6d)"
+	assert staleness.rollup_text(rollup, limit=1) == "a@example.com (3, oldest 12d), and 2 more"
+
+
+def test_precomputed_ages_are_used():
+	frame = staleness.StalenessFrame.from_rows([row('A-1', timedelta(days=1)), row('A-2', timedelta(days=9))])
+	ages = [10, 1]
+	assert frame.stale_mask(ages=ages, threshold_days=5) == [True, False]
+	assert frame.rollup('status', [True, True], ages=ages) == [("In Progress", 2, 10)]
+
+
+def test_reminder_ages_rows_once(monkeypatch):
+	for module in ("dotenv", "pytz"):
+		pytest.importorskip(module)
+	import app
+	
+	calls = []
+	age_days = staleness.StalenessFrame.age_days
+	
+	def counting_age_days(self, now=None):
+		calls.append(now)
+		return age_days(self, now)
+	
+	monkeypatch.setattr(staleness.StalenessFrame, 'age_days', counting_age_days)
+	rows = [dict(row(key, age, "a@example.com"), type="Initiative", current_status="🔴 Red", summary=key)
+	        for key, age in [('A-1', timedelta(days=9)), ('A-2', timedelta(days=1)), ('A-3', None)]]
+	blocks = app.build_reminder_blocks(rows, now=NOW)
+	assert calls == [NOW]
+	assert blocks[1]['elements'][0]['text'].startswith("*2* of 3 stale by owner: a@example.com (2, never updated)")
+	assert [block['text']['text'].split('|')[1].split('>')[0] for block in blocks[3:]] == ['A-1', 'A-3']
@@ -0,0 +1,27 @@
+import random
+
+import pytest
+
+import fakes
+import text_diff
+
+
+@pytest.mark.parametrize('n_lines', [50, 250, 600])
+@pytest.mark.parametrize('edit_ratio', [0.05, 0.3, 0.8])
+@pytest.mark.parametrize('repeated_lines', [[""], ["", "* ", "TBD", "h3. Notes"]])
+def test_matches_ndiff(n_lines, edit_ratio, repeated_lines):
+	rng = random.Random(n_lines * 100 + int(edit_ratio * 100))
+	for _ in range(3):
+		old_text, new_text = fakes.field_edit(rng, n_lines, edit_ratio, repeated_lines)
+		assert text_diff.added_lines(old_text, new_text) == text_diff.ndiff_added_lines(old_text, new_text)
+
+
+@pytest.mark.parametrize('old_text, new_text', [
+	(None, "a\nb"),
+	("", "a"),
+	("a\nb", None),
+	("a\nb", "a\nb"),
+	("a\nb\nc", "a\nx\nc\nd"),
+])
+def test_edge_cases_match_ndiff(old_text, new_text):
+	assert text_diff.added_lines(old_text, new_text) == text_diff.ndiff_added_lines(old_text, new_text)
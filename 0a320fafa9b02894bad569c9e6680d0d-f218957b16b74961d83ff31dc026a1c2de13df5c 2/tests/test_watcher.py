@@ -0,0 +1,136 @@
+import hashlib
+import hmac
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("pytz")
+
+import metrics
+import page
+import teams
+import watcher
+
+
+@pytest.fixture
+def team_watcher(stand_ins):
+	"""A Watcher over the default team that publishes its page but posts no Slack digest."""
+	team_watcher = watcher.Watcher([teams.default_team()], notify=False)
+	yield team_watcher
+	team_watcher.close()
+
+
+def test_poll_renders_only_the_changed_section(stand_ins, team_watcher):
+	jira, confluence, _ = stand_ins
+	team_watcher.start()
+	state = team_watcher.states[0]
+	key = sorted(state.sections)[0]
+	metrics.reset()
+	
+	jira.edit(key, text="Rolled out to every region")
+	assert team_watcher.poll() == {key}
+	counters = metrics.snapshot()['counters']
+	assert counters['page.sections_reused'] == len(state.sections) - 1
+	assert confluence.calls['update_page'] == 1
+	assert "Rolled out to every region" in confluence.pages[state.page_title]['body']['storage']['value']
+
+
+def test_unchanged_poll_does_not_republish(stand_ins, team_watcher):
+	_, confluence, _ = stand_ins
+	team_watcher.start()
+	assert team_watcher.poll() == set()
+	assert confluence.calls['create_page'] == 1
+	assert confluence.calls['update_page'] == 0
+
+
+def test_failed_render_is_retried(stand_ins, team_watcher, monkeypatch):
+	_, confluence, _ = stand_ins
+	process_issue = page.process_issue
+	failed = []
+	
+	def fail_once(issue, issue_obj=None):
+		if not failed:
+			failed.append(issue['key'])
+			raise RuntimeError("Jira timed out")
+		return process_issue(issue, issue_obj)
+	
+	monkeypatch.setattr(page, 'process_issue', fail_once)
+	team_watcher.start()
+	state = team_watcher.states[0]
+	assert state.page_title is None
+	assert confluence.calls['create_page'] == 0
+	
+	# The issue hasn't changed, but its failed render must not be reused
+	team_watcher.refresh_team(state, publish=True)
+	assert confluence.calls['create_page'] == 1
+	assert state.sections[failed[0]][1].exception() is None
+
+
+def post(server, body=b'{}', signature=None):
+	"""
+	:return: The status code the webhook endpoint answered a POST with.
+	"""
+	headers = {'X-Hub-Signature': signature} if signature else {}
+	request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}/", body, headers, method='POST')
+	try:
+		with urllib.request.urlopen(request, timeout=5) as response:
+			return response.status
+	except urllib.error.HTTPError as e:
+		return e.code
+
+
+def test_webhook_requires_a_secret():
+	with pytest.raises(ValueError):
+		watcher.serve_webhooks(0, threading.Event(), secret=None, allow_unsigned=False)
+
+
+def test_webhook_accepts_only_signed_requests():
+	wake = threading.Event()
+	server = watcher.serve_webhooks(0, wake, secret='s3cret')
+	try:
+		assert server.server_address[0] == '127.0.0.1'
+		assert post(server) == 401
+		assert post(server, signature='sha256=' + '0' * 64) == 401
+		assert not wake.is_set()
+		body = b'{"webhookEvent": "jira:issue_updated"}'
+		signature = 'sha256=' + hmac.new(b's3cret', body, hashlib.sha256).hexdigest()
+		assert post(server, body, signature) == 204
+		assert wake.is_set()
+	finally:
+		server.shutdown()
+		server.server_close()
+
+
+def test_webhook_accepts_unsigned_requests_when_allowed():
+	wake = threading.Event()
+	server = watcher.serve_webhooks(0, wake, secret=None, allow_unsigned=True)
+	try:
+		assert post(server) == 204
+		assert wake.is_set()
+	finally:
+		server.shutdown()
+		server.server_close()
+
+
+def test_pages_show_the_date_they_were_rendered(stand_ins, team_watcher, monkeypatch):
+	_, confluence, _ = stand_ins
+	team_watcher.start()
+	state = team_watcher.states[0]
+	assert f"<tr><td><p>{datetime.now().strftime('%m/%d')}</p></td>" in \
+	       confluence.pages[state.page_title]['body']['storage']['value']
+	
+	class NextWeek(datetime):
+		@classmethod
+		def now(cls, tz=None):
+			return datetime.now(tz) + timedelta(days=7)
+	
+	monkeypatch.setattr(page, 'datetime', NextWeek)
+	team_watcher.poll()
+	next_review = page.review_page_title(state.team)
+	assert state.page_title == next_review
+	assert f"<tr><td><p>{NextWeek.now().strftime('%m/%d')}</p></td>" in \
+	       confluence.pages[next_review]['body']['storage']['value']
@@ -0,0 +1,44 @@
+"""Line-level diff helpers for TLDR/Next Steps field edits."""
+from difflib import SequenceMatcher, ndiff
+
+
+def ndiff_added_lines(old_text, new_text):
+	"""
+	The reference for added_lines: the '+ ' lines of difflib.ndiff, which fuzzy-matches every replaced line against
+	every other and is slow on long, heavily edited fields.
+
+	:param old_text: The previous field value, or None.
+	:param new_text: The new field value, or None.
+	:return: A list of the added lines, in order.
+	"""
+	diff_generator = ndiff((old_text or "").splitlines(), (new_text or "").splitlines())
+	return [line[2:] for line in diff_generator if line.startswith('+ ')]
+
+
+def added_lines(old_text, new_text):
+	"""
+	Returns the lines of new_text that a line diff against old_text reports as added, i.e. ndiff_added_lines. The line-level opcodes are the ones ndiff computes; every new line of an inserted or replaced
+	block is added, so ndiff's intraline fuzzy matching, which only annotates replaced lines, is skipped. The one
+	exception is a replaced block holding a line identical on both sides, which only happens with lines autojunk
+	treats as junk: ndiff may synchronize on such a line, so those diffs are left to ndiff itself.
+
+	:param old_text: The previous field value, or None.
+	:param new_text: The new field value, or None.
+	:return: A list of the added lines, in order.
+	"""
+	old_lines = (old_text or "").splitlines()
+	new_lines = (new_text or "").splitlines()
+	if not old_lines:
+		return new_lines
+	if old_lines == new_lines:
+		return []
+	
+	out = []
+	for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+		if tag == 'insert':
+			out.extend(new_lines[j1:j2])
+		elif tag == 'replace':
+			if not set(old_lines[i1:i2]).isdisjoint(new_lines[j1:j2]):
+				return ndiff_added_lines(old_text, new_text)
+			out.extend(new_lines[j1:j2])
+	return out
@@ -0,0 +1,294 @@
+#!/usr/bin/python3
+"""
+Long-running mode that keeps the clients and the issue snapshot warm and keeps each team's review page and Slack
+digest current all week. Jira is polled for recently updated issues, or woken early by a Jira webhook, and only the
+initiatives that changed are refetched and re-rendered.
+"""
+import argparse
+import hashlib
+import hmac
+import logging
+import math
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+import app
+import clients
+import consts
+import history
+import issue_cache
+import jira_data
+import metrics
+import notifier
+import page
+import teams
+
+load_dotenv()
+
+# Environment Variables
+# Seconds between polls for updated issues
+WATCH_INTERVAL_SECONDS = float(os.getenv("WATCH_INTERVAL_SECONDS", "300"))
+# Seconds between full re-listings of every query, which also drop issues that stopped matching
+WATCH_RESYNC_SECONDS = float(os.getenv("WATCH_RESYNC_SECONDS", "3600"))
+# Port of the local Jira webhook endpoint; 0 disables it
+WATCH_WEBHOOK_PORT = int(os.getenv("WATCH_WEBHOOK_PORT", "0"))
+# Address the webhook endpoint listens on; set it to 0.0.0.0 to accept requests from other hosts
+WATCH_WEBHOOK_BIND = os.getenv("WATCH_WEBHOOK_BIND", "127.0.0.1")
+# Secret the Jira webhook signs its payloads with; the endpoint refuses to start without it
+WATCH_WEBHOOK_SECRET = os.getenv("WATCH_WEBHOOK_SECRET")
+# Start the endpoint without a secret and accept unsigned requests, e.g. behind a proxy that authenticates Jira
+WATCH_WEBHOOK_ALLOW_UNSIGNED = os.getenv("WATCH_WEBHOOK_ALLOW_UNSIGNED", "").lower() in ("1", "true", "yes")
+
+# Constants
+# Added to each poll's window so updates made while the previous poll ran are not missed
+POLL_OVERLAP_MINUTES = 1
+
+logger = logging.getLogger(__name__)
+
+
+class TeamState:
+	"""What the watcher last rendered, published and posted for one team."""
+	
+	def __init__(self, team):
+		"""
+		:param team: The Team the state belongs to.
+		"""
+		self.team = team
+		# Rendered page sections, reused for initiatives that haven't been updated; see page.render_section
+		self.sections = {}
+		self.page_title = None
+		# The history.RunSnapshot of the review before the current page's
+		self.previous = None
+		# The (ts, blocks) pairs of the digest posted to each channel
+		self.digests = {}
+
+
+class Watcher:
+	"""
+	Polls Jira for issues updated since the last poll and refreshes the teams whose initiatives changed. Pages are
+	re-rendered from cached sections, only changed initiatives are rendered again, and unchanged bodies are never
+	republished. Posted Slack digests are edited in place as initiatives are updated or become stale.
+	"""
+	
+	def __init__(self, team_list, publish=True, notify=True, interval=WATCH_INTERVAL_SECONDS,
+	             resync_interval=WATCH_RESYNC_SECONDS):
+		"""
+		:param team_list: The Teams to keep current.
+		:param publish: Publish the teams' Confluence pages.
+		:param notify: Post the teams' Slack digests on start and keep them current.
+		:param interval: Seconds between polls.
+		:param resync_interval: Seconds between full re-listings of every query.
+		"""
+		self.states = [TeamState(team) for team in team_list]
+		self.publish = publish
+		self.notify = notify
+		self.interval = interval
+		self.resync_interval = resync_interval
+		self.cache = issue_cache.IssueCache.from_env()
+		self.history = history.HistoryStore.from_env()
+		self.snapshot = jira_data.IssueSnapshot(clients.get_jira(), [], consts.page_report_fields, cache=self.cache)
+		self.render_pool = ThreadPoolExecutor(max_workers=page.RENDER_WORKERS)
+		self.wake = threading.Event()
+		self.last_poll = None
+		self.last_resync = None
+	
+	def start(self):
+		"""
+		Loads every team's queries and publishes and posts each team's report.
+
+		:return: None
+		"""
+		self.last_poll = self.last_resync = time.monotonic()
+		with metrics.stage('watcher.start'):
+			for state in self.states:
+				self.snapshot.load(state.team.jql)
+				self.snapshot.load(state.team.filter_jql)
+			for state in self.states:
+				self.refresh_team(state, publish=True)
+	
+	def poll(self, full=False):
+		"""
+		Syncs every loaded query with Jira and refreshes the teams whose initiatives changed.
+
+		:param full: Re-list every query instead of only the issues updated since the last poll.
+		:return: The set of issue keys that changed.
+		"""
+		started = time.monotonic()
+		within_minutes = None if full else math.ceil((started - self.last_poll) / 60) + POLL_OVERLAP_MINUTES
+		with metrics.stage('watcher.poll', full=full):
+			changed_by_query = {query: self.snapshot.sync(query, within_minutes) for query in self.snapshot.queries()}
+		self.last_poll = started
+		if full:
+			self.last_resync = started
+			if self.cache is not None:
+				self.cache.evict()
+		
+		changed = set().union(*changed_by_query.values())
+		if changed:
+			logger.info(f"{len(changed)} issues changed: {', '.join(sorted(changed))}")
+		for state in self.states:
+			team = state.team
+			team_changed = changed_by_query.get(team.jql, set()) | changed_by_query.get(team.filter_jql, set())
+			# The page title moves to the next review date once the review has passed
+			publish = bool(team_changed) or state.page_title != page.review_page_title(team)
+			self.refresh_team(state, publish)
+		return changed
+	
+	def refresh_team(self, state, publish):
+		"""
+		Errors are logged so one team's failure doesn't stop the watcher. Every publish is recorded in the history
+		store, where it replaces the earlier runs of the same page, and the next review's pages are compared with it.
+
+		:param state: The TeamState of the team to refresh.
+		:param publish: Re-render and publish the page; the digest is checked on every refresh since initiatives
+		                become stale as time passes.
+		:return: None
+		"""
+		team = state.team
+		if self.publish and publish:
+			try:
+				page_title = page.review_page_title(team)
+				new_review = page_title != state.page_title
+				if new_review and self.history is not None:
+					state.previous = self.history.previous(team.name, page_title)
+				rows = app.get_last_modifier_data(self.snapshot, team.jql)
+				current_keys = {row['key'] for row in rows}
+				state.sections = {key: section for key, section in state.sections.items() if key in current_keys}
+				page.load_sections(self.cache, rows, state.sections)
+				body = page.build_page_body(team, self.snapshot, self.render_pool, state.sections, state.previous,
+				                            rows)
+				page.save_sections(self.cache, state.sections)
+				published = page.create_or_update_page(page_title, body, parent_page_id=team.parent_page_id)
+				state.page_title = page_title
+				if published and self.history is not None:
+					page.record_run(self.history, team, page_title, rows)
+			except Exception:
+				logger.exception(f"Publishing {team.name}'s page failed")
+		if self.notify:
+			self.update_digests(state)
+	
+	def update_digests(self, state):
+		from slack_sdk.errors import SlackApiError
+		
+		team = state.team
+		blocks = app.build_reminder_blocks(app.get_last_modifier_data(self.snapshot, team.jql), team.slack_mention)
+		for channel_id in team.slack_channel_ids:
+			try:
+				state.digests[channel_id] = notifier.update_blocks(channel_id, state.digests.get(channel_id, []), blocks)
+			except SlackApiError as e:
+				logger.error(f"Error updating the digest in {channel_id}: {e}")
+	
+	def run(self, stop):
+		"""
+		Starts the watcher and polls until stop is set. Polls happen every interval, or as soon as wake is set.
+
+		:param stop: A threading.Event that ends the loop.
+		:return: None
+		"""
+		self.start()
+		while not stop.is_set():
+			self.wake.wait(max(0.0, self.last_poll + self.interval - time.monotonic()))
+			self.wake.clear()
+			if stop.is_set():
+				break
+			try:
+				self.poll(full=time.monotonic() - self.last_resync >= self.resync_interval)
+			except Exception:
+				logger.exception("Poll failed, retrying at the next interval")
+	
+	def close(self):
+		self.render_pool.shutdown()
+		if self.cache is not None:
+			self.cache.close()
+
+
+def webhook_handler(wake, secret=WATCH_WEBHOOK_SECRET):
+	"""
+	:param wake: The threading.Event set when Jira reports a change.
+	:param secret: The secret Jira signs payloads with, checked against the X-Hub-Signature header. Every request
+	               is accepted when it is None; serve_webhooks only allows that with WATCH_WEBHOOK_ALLOW_UNSIGNED.
+	:return: A BaseHTTPRequestHandler class for the webhook endpoint.
+	"""
+	
+	class JiraWebhookHandler(BaseHTTPRequestHandler):
+		def do_POST(self):
+			body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+			if secret:
+				expected = 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+				if not hmac.compare_digest(expected, self.headers.get('X-Hub-Signature', '')):
+					self.send_response(401)
+					self.end_headers()
+					return
+			# The payload isn't needed: the next poll picks up every issue updated since the last one
+			metrics.count('watcher.webhooks')
+			wake.set()
+			self.send_response(204)
+			self.end_headers()
+		
+		def log_message(self, format, *args):
+			logger.debug(format % args)
+	
+	return JiraWebhookHandler
+
+
+def serve_webhooks(port, wake, bind=WATCH_WEBHOOK_BIND, secret=WATCH_WEBHOOK_SECRET,
+                   allow_unsigned=WATCH_WEBHOOK_ALLOW_UNSIGNED):
+	"""
+	Every accepted request triggers a poll of Jira, so the endpoint only listens locally by default and requires
+	signed requests.
+
+	:param port: The port to listen on; 0 picks a free port.
+	:param wake: The threading.Event set when Jira reports a change.
+	:param bind: The address to listen on.
+	:param secret: The secret Jira signs payloads with.
+	:param allow_unsigned: Start without a secret and accept unsigned requests.
+	:return: The running ThreadingHTTPServer; call shutdown() to stop it.
+	"""
+	if not secret and not allow_unsigned:
+		raise ValueError("Set WATCH_WEBHOOK_SECRET to serve Jira webhooks, or WATCH_WEBHOOK_ALLOW_UNSIGNED=true to "
+		                 "accept unsigned requests")
+	server = ThreadingHTTPServer((bind, port), webhook_handler(wake, secret or None))
+	threading.Thread(target=server.serve_forever, name='jira-webhooks', daemon=True).start()
+	logger.info(f"Listening for Jira webhooks on {bind}:{server.server_address[1]}")
+	return server
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Keep execution review pages and Slack digests current.")
+	parser.add_argument('--config', default=teams.TEAMS_CONFIG,
+	                    help="JSON list of team definitions (default: $TEAMS_CONFIG, or the Cloud Platform team)")
+	parser.add_argument('--no-publish', action='store_true', help="don't publish Confluence pages")
+	parser.add_argument('--no-notify', action='store_true', help="don't post or update Slack digests")
+	parser.add_argument('--interval', type=float, default=WATCH_INTERVAL_SECONDS, help="seconds between polls")
+	parser.add_argument('--webhook-port', type=int, default=WATCH_WEBHOOK_PORT,
+	                    help="serve a Jira webhook endpoint on this port; 0 disables it")
+	parser.add_argument('--webhook-bind', default=WATCH_WEBHOOK_BIND,
+	                    help="address the webhook endpoint listens on (default: $WATCH_WEBHOOK_BIND, or 127.0.0.1)")
+	args = parser.parse_args()
+	
+	metrics.configure()
+	stop_event = threading.Event()
+	watcher = Watcher(teams.load_teams(args.config), publish=not args.no_publish, notify=not args.no_notify,
+	                  interval=args.interval)
+	
+	def handle_sigterm(signum, frame):
+		stop_event.set()
+		watcher.wake.set()
+	
+	signal.signal(signal.SIGTERM, handle_sigterm)
+	webhook_server = serve_webhooks(args.webhook_port, watcher.wake, args.webhook_bind) if args.webhook_port else None
+	try:
+		watcher.run(stop_event)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		if webhook_server is not None:
+			webhook_server.shutdown()
+		watcher.close()
+		metrics.log_summary()